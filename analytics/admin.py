@@ -1,6 +1,10 @@
 from django.contrib import admin
 
-from .models import View, Trending
+from .models import View, Trending, HourlyViewCount, DailyViewCount, UniqueViewSketch, TagCount
 
 admin.site.register(View)
 admin.site.register(Trending)
+admin.site.register(HourlyViewCount)
+admin.site.register(DailyViewCount)
+admin.site.register(UniqueViewSketch)
+admin.site.register(TagCount)
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import View, UniqueViewSketch
+from .hll import HyperLogLog
+from memes.models import User
+
+import atexit
+import logging
+import threading
+from collections import Counter
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+    """
+    Buffer views in memory and write them in bulk from a background thread
+
+    Each flush is one bulk INSERT of View rows, one UPDATE of num_views per object viewed,
+    and one update of the unique viewer sketch per object viewed per day,
+    so requests that view memes/pages/profiles don't write to the database
+    """
+
+    def __init__(self, interval, max_size):
+        # Seconds between flushes (0 to write views in the request that adds them)
+        self.interval = interval
+        # Flush early if this many views are buffered
+        self.max_size = max_size
+        self.views = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, model, object_id, user, viewer=None):
+        """ viewer identifies user or anonymous user for counting unique viewers """
+        with self.lock:
+            self.views.append((model, object_id, user.id if user.is_authenticated else None, viewer, timezone.now()))
+            full = len(self.views) >= self.max_size
+
+            if self.interval and self.thread is None:
+                # Start on first view so each worker flushes its own buffer (a thread started on import
+                # stays in the master process after forking, leaving views here until the buffer fills)
+                self.thread = threading.Thread(target=self.run, name="view-buffer", daemon=True)
+                self.thread.start()
+
+        if not self.interval:
+            self.flush()
+        elif full:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write views")
+
+    def flush(self):
+        with self.lock:
+            views, self.views = self.views, []
+
+        if not views:
+            return
+
+        try:
+            self.write(views)
+        except Exception:
+            # Put views back to be written with the next flush (newest are dropped if database is down for long)
+            with self.lock:
+                self.views[:0] = views
+                del self.views[self.max_size * 10:]
+            raise
+
+    def write(self, views):
+        # Views of users deleted since they were buffered would fail the whole batch
+        user_ids = {user_id for _, _, user_id, _, _ in views if user_id is not None}
+        existing = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True)) if user_ids else set()
+        views = [view for view in views if view[2] is None or view[2] in existing]
+
+        counts = Counter((model, object_id) for model, object_id, *_ in views)
+        content_types = ContentType.objects.get_for_models(*{model for model, _ in counts})
+
+        viewers = {}
+        for model, object_id, _, viewer, timestamp in views:
+            if viewer:
+                viewers.setdefault((model, object_id, timestamp.date()), set()).add(viewer)
+
+        with transaction.atomic():
+            View.objects.bulk_create([
+                View(user_id=user_id, content_type=content_types[model], object_id=object_id, timestamp=timestamp)
+                for model, object_id, user_id, _, timestamp in views
+            ], batch_size=1000)
+
+            # Sort to always lock rows in the same order
+            for (model, object_id), n in sorted(counts.items(), key=lambda c: (c[0][0].__name__, c[0][1])):
+                model._base_manager.filter(id=object_id).update(num_views=F("num_views") + n)
+
+            for (model, object_id, day), ids in sorted(viewers.items(), key=lambda v: (v[0][0].__name__, *v[0][1:])):
+                sketch = UniqueViewSketch.objects.select_for_update().get_or_create(
+                    content_type=content_types[model],
+                    object_id=object_id,
+                    day=day
+                )[0]
+                hll = HyperLogLog.from_bytes(sketch.registers)
+                for viewer in ids:
+                    hll.add(viewer)
+                sketch.registers = hll.to_bytes()
+                sketch.save(update_fields=["registers"])
+
+
+view_buffer = ViewBuffer(settings.VIEW_BUFFER_INTERVAL, settings.VIEW_BUFFER_SIZE)
+
+# Write remaining views when process exits
+atexit.register(view_buffer.flush)
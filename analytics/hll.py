@@ -0,0 +1,50 @@
+from hashlib import blake2b
+import math
+import zlib
+
+
+class HyperLogLog:
+    """
+    Estimate number of unique values using 2^precision one-byte registers
+
+    Standard error is about 1.04 / sqrt(2^precision) (~3.3% for default precision of 10),
+    sketches with the same precision can be merged to count unique values across all of them
+    """
+
+    def __init__(self, precision: int = 10, registers: bytes = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+        assert len(self.registers) == self.m
+
+    def add(self, value: str):
+        h = int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+        # First bits choose register, rank is position of first 1 bit in the remaining bits
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        assert self.precision == other.precision
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / sum(2.0 ** -r for r in self.registers)
+
+        # Use linear counting for small numbers of values
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """ Compressed registers (mostly zeros for objects with few viewers) """
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = 10) -> "HyperLogLog":
+        return cls(precision, zlib.decompress(data) if data else None)
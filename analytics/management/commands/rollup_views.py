@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import rollup_views, prune_views, fold_view_sketches
+
+
+class Command(BaseCommand):
+    help = "Add new views to hourly and daily view counts then delete old views (run periodically, e.g. hourly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--no-prune", action="store_true",
+            help="Don't delete views or fold unique viewer sketches past retention period"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        total = 0
+        while True:
+            n = rollup_views(batch_size)
+            total += n
+            if n < batch_size:
+                break
+        self.stdout.write(f"Rolled up {total} views")
+
+        if not options["no_prune"]:
+            total = 0
+            while True:
+                n = prune_views(batch_size)
+                total += n
+                if n < batch_size:
+                    break
+            self.stdout.write(f"Deleted {total} old views")
+
+            total = 0
+            while True:
+                n = fold_view_sketches(batch_size)
+                total += n
+                if n < batch_size:
+                    break
+            self.stdout.write(f"Folded {total} old unique viewer sketches")
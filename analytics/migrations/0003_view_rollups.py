@@ -0,0 +1,62 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('analytics', '0002_view_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyViewCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyViewCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ViewRollupState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_view_id', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='view',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='analytics_v_content_1b7dae_idx'),
+        ),
+        migrations.AddField(
+            model_name='hourlyviewcount',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='dailyviewcount',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyviewcount',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'bucket'), name='unique_hourly_view_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyviewcount',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'bucket'), name='unique_daily_view_count'),
+        ),
+    ]
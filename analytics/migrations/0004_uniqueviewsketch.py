@@ -0,0 +1,29 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('analytics', '0003_view_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueViewSketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('day', models.DateField()),
+                ('registers', models.BinaryField(default=bytes)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='uniqueviewsketch',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'day'), name='unique_view_sketch'),
+        ),
+    ]
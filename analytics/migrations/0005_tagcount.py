@@ -0,0 +1,41 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+# Count tags of memes from the past week so that trending tags aren't empty after migrating
+BACKFILL_TAG_COUNTS = """
+INSERT INTO analytics_tagcount (tag, bucket, count)
+SELECT t.tag, date_trunc('hour', m.upload_date), count(*)
+FROM memes_meme m CROSS JOIN LATERAL unnest(m.tags_lower) AS t(tag)
+WHERE NOT m.private AND NOT m.page_private AND NOT m.hidden AND m.upload_date > now() - interval '7 days'
+GROUP BY 1, 2
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_uniqueviewsketch'),
+        ('memes', '0007_memevotedelta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=64)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tagcount',
+            index=models.Index(fields=['bucket'], name='analytics_t_bucket_ca2c66_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagcount',
+            constraint=models.UniqueConstraint(fields=('tag', 'bucket'), name='unique_tag_count'),
+        ),
+        migrations.RunSQL(BACKFILL_TAG_COUNTS, migrations.RunSQL.noop),
+    ]
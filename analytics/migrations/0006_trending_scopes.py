@@ -0,0 +1,45 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+# Count tags of memes in categories and pages from the past week
+BACKFILL_SCOPED_TAG_COUNTS = """
+INSERT INTO analytics_tagcount (scope, tag, bucket, count)
+SELECT s.scope, t.tag, date_trunc('hour', m.upload_date), count(*)
+FROM memes_meme m
+    LEFT JOIN memes_category c ON c.id = m.category_id
+    CROSS JOIN LATERAL (VALUES ('category:' || c.name), ('page:' || nullif(m.page_name, ''))) AS s(scope)
+    CROSS JOIN LATERAL unnest(m.tags_lower) AS t(tag)
+WHERE s.scope IS NOT NULL AND NOT m.private AND NOT m.page_private AND NOT m.hidden
+    AND m.upload_date > now() - interval '7 days'
+GROUP BY 1, 2, 3
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_tagcount'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='tagcount',
+            name='unique_tag_count',
+        ),
+        migrations.AddField(
+            model_name='tagcount',
+            name='scope',
+            field=models.CharField(blank=True, default='', max_length=48),
+        ),
+        migrations.AddField(
+            model_name='trending',
+            name='scopes',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddConstraint(
+            model_name='tagcount',
+            constraint=models.UniqueConstraint(fields=('scope', 'tag', 'bucket'), name='unique_tag_count'),
+        ),
+        migrations.RunSQL(BACKFILL_SCOPED_TAG_COUNTS, migrations.RunSQL.noop),
+    ]
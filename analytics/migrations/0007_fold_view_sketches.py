@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_trending_scopes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uniqueviewsketch',
+            name='day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='uniqueviewsketch',
+            constraint=models.UniqueConstraint(condition=models.Q(day=None), fields=('content_type', 'object_id'), name='unique_folded_view_sketch'),
+        ),
+    ]
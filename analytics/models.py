@@ -1,9 +1,10 @@
 from django.db import models
-from django.db.models import Q, CheckConstraint
+from django.db.models import Q, CheckConstraint, UniqueConstraint
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 
 from memes.models import Meme
 
@@ -13,24 +14,105 @@ class View(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, blank=True)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey("content_type", "object_id")
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add so that buffered views keep the time they happened
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["content_type", "object_id", "timestamp"])]
 
     def __str__(self):
         return f"{self.content_object} viewed on {self.timestamp}"
 
 
+class ViewCount(models.Model):
+    """ Number of views of an object in a time bucket, filled from View by rollups.rollup_views """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    # Start of hour or day
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.content_object} viewed {self.count} times from {self.bucket}"
+
+
+class HourlyViewCount(ViewCount):
+    class Meta:
+        constraints = [UniqueConstraint(fields=["content_type", "object_id", "bucket"], name="unique_hourly_view_count")]
+
+
+class DailyViewCount(ViewCount):
+    class Meta:
+        constraints = [UniqueConstraint(fields=["content_type", "object_id", "bucket"], name="unique_daily_view_count")]
+
+
+class UniqueViewSketch(models.Model):
+    """
+    HyperLogLog sketch of viewers of an object on a day (see hll.HyperLogLog)
+
+    Days older than VIEW_RETENTION_DAYS are folded into one sketch per object with no day (see rollups.fold_view_sketches)
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    day = models.DateField(null=True, blank=True)
+    registers = models.BinaryField(default=bytes)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=["content_type", "object_id", "day"], name="unique_view_sketch"),
+            # NULLs aren't equal in unique constraints
+            UniqueConstraint(fields=["content_type", "object_id"], condition=Q(day=None), name="unique_folded_view_sketch"),
+        ]
+
+    def __str__(self):
+        return f"Viewers of {self.content_object} {f'on {self.day}' if self.day else 'before last days'}"
+
+
+class ViewRollupState(models.Model):
+    """ Single row storing ID of last View added to rollups """
+    last_view_id = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Views rolled up to {self.last_view_id}"
+
+
 def empty_list():
     return []
 
 
 class Trending(models.Model):
+    # Trending tags of all memes
     data = ArrayField(models.CharField(max_length=64, blank=False), default=empty_list)
+    # Trending tags of each category/page that has any, e.g. {"category:movies": [...], "page:name": [...]}
+    scopes = models.JSONField(default=dict)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Trending data - {self.timestamp}"
 
 
+class TagCount(models.Model):
+    """ Number of public memes uploaded with a tag in an hour, kept up to date on upload/delete (see trending.py) """
+    # "" for all memes, "category:<name>" or "page:<name>"
+    scope = models.CharField(max_length=48, blank=True, default="")
+    tag = models.CharField(max_length=64, blank=False)
+    # Start of hour
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=["scope", "tag", "bucket"], name="unique_tag_count")]
+        indexes = [models.Index(fields=["bucket"])]
+
+    def __str__(self):
+        return f"#{self.tag} used {self.count} times from {self.bucket}"
+
+
 class AdminHoneypot(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
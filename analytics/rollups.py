@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction, connection
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import View, HourlyViewCount, DailyViewCount, ViewRollupState, UniqueViewSketch
+from .hll import HyperLogLog
+
+from datetime import timedelta
+
+
+# Only roll up views older than this so that views still being written aren't skipped
+ROLLUP_LAG = timedelta(minutes=5)
+
+UPSERT_VIEW_COUNTS = """
+INSERT INTO {table} (content_type_id, object_id, bucket, count) VALUES (%s, %s, %s, %s)
+ON CONFLICT (content_type_id, object_id, bucket) DO UPDATE SET count = {table}.count + EXCLUDED.count
+"""
+
+
+def rollup_views(batch_size: int = 10000) -> int:
+    """ Add a batch of new views to hourly and daily view counts, returns number of views added """
+    with transaction.atomic():
+        state = ViewRollupState.objects.select_for_update().get_or_create(id=1)[0]
+
+        ids = View.objects.filter(id__gt=state.last_view_id, timestamp__lt=timezone.now()-ROLLUP_LAG) \
+                          .order_by("id") \
+                          .values_list("id", flat=True)[:batch_size]
+        ids = list(ids)
+        if not ids:
+            return 0
+
+        hourly = View.objects.filter(id__gt=state.last_view_id, id__lte=ids[-1]) \
+                             .annotate(hour=TruncHour("timestamp")) \
+                             .values_list("content_type_id", "object_id", "hour") \
+                             .annotate(n=Count("id")) \
+                             .order_by()
+
+        hourly = list(hourly)
+        daily = {}
+        for content_type_id, object_id, hour, n in hourly:
+            key = (content_type_id, object_id, hour.replace(hour=0))
+            daily[key] = daily.get(key, 0) + n
+
+        with connection.cursor() as cursor:
+            cursor.executemany(UPSERT_VIEW_COUNTS.format(table=HourlyViewCount._meta.db_table), hourly)
+            cursor.executemany(
+                UPSERT_VIEW_COUNTS.format(table=DailyViewCount._meta.db_table),
+                [(*key, n) for key, n in daily.items()]
+            )
+
+        state.last_view_id = ids[-1]
+        state.save(update_fields=["last_view_id"])
+
+    return len(ids)
+
+
+def prune_views(batch_size: int = 10000) -> int:
+    """ Delete a batch of views past retention period that were already rolled up """
+    last_view_id = ViewRollupState.objects.values_list("last_view_id", flat=True).first() or 0
+    cutoff = timezone.now() - timedelta(days=settings.VIEW_RETENTION_DAYS)
+
+    ids = View.objects.filter(id__lte=last_view_id, timestamp__lt=cutoff) \
+                      .order_by("id") \
+                      .values_list("id", flat=True)[:batch_size]
+
+    return View.objects.filter(id__in=list(ids)).delete()[0]
+
+
+def fold_view_sketches(batch_size: int = 10000) -> int:
+    """
+    Merge a batch of daily unique viewer sketches past retention period into the all-time sketch of their object,
+    so each object has at most VIEW_RETENTION_DAYS + 1 sketches, returns number of daily sketches folded
+    """
+    cutoff = timezone.now().date() - timedelta(days=settings.VIEW_RETENTION_DAYS)
+
+    with transaction.atomic():
+        sketches = list(
+            UniqueViewSketch.objects.select_for_update(skip_locked=True)
+                                    .filter(day__lt=cutoff)
+                                    .order_by("content_type_id", "object_id", "id")[:batch_size]
+        )
+
+        folded = {}
+        for sketch in sketches:
+            hll = folded.setdefault((sketch.content_type_id, sketch.object_id), HyperLogLog())
+            hll.merge(HyperLogLog.from_bytes(sketch.registers))
+
+        for (content_type_id, object_id), hll in folded.items():
+            all_time = UniqueViewSketch.objects.select_for_update().get_or_create(
+                content_type_id=content_type_id,
+                object_id=object_id,
+                day=None
+            )[0]
+            hll.merge(HyperLogLog.from_bytes(all_time.registers))
+            all_time.registers = hll.to_bytes()
+            all_time.save(update_fields=["registers"])
+
+        UniqueViewSketch.objects.filter(id__in=[sketch.id for sketch in sketches]).delete()
+
+    return len(sketches)
+
+
+def get_view_counts(obj, period: str = "day", since=None) -> list:
+    """ Get list of (bucket, count) for views of meme, page, or profile from rollups """
+    assert period in ("hour", "day")
+
+    Model = HourlyViewCount if period == "hour" else DailyViewCount
+    counts = Model.objects.filter(content_type=ContentType.objects.get_for_model(obj), object_id=obj.id)
+    if since:
+        counts = counts.filter(bucket__gte=since)
+
+    return list(counts.order_by("bucket").values_list("bucket", "count"))
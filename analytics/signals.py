@@ -1,38 +1,46 @@
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver, Signal
-from django.db.models import F
 
-from .models import View
+from .buffer import view_buffer
+from .trending import count_tags
 from memes.models import Meme, Profile, Page
 
 
-meme_viewed_signal = Signal(providing_args=["user", "meme"])
+"""
+Views are buffered and written in bulk (see buffer.ViewBuffer)
+"""
 
 
-@receiver(meme_viewed_signal, sender=Meme)
-def add_meme_view(sender, user, meme, **kwargs):
-    meme.num_views = F("num_views") + 1
-    meme.save(update_fields=["num_views"])
+meme_viewed_signal = Signal(providing_args=["user", "meme", "viewer"])
+
 
-    View.objects.create(user=user if user.is_authenticated else None, content_object=meme)
+@receiver(meme_viewed_signal, sender=Meme)
+def add_meme_view(sender, user, meme, viewer=None, **kwargs):
+    view_buffer.add(Meme, meme.id, user, viewer)
 
 
-profile_view_signal = Signal(providing_args=["user", "profile"])
+profile_view_signal = Signal(providing_args=["user", "profile", "viewer"])
 
 
 @receiver(profile_view_signal, sender=Profile)
-def add_profile_view(sender, user, profile, **kwargs):
-    profile.num_views = F("num_views") + 1
-    profile.save(update_fields=["num_views"])
-
-    View.objects.create(user=user if user.is_authenticated else None, content_object=profile)
+def add_profile_view(sender, user, profile, viewer=None, **kwargs):
+    view_buffer.add(Profile, profile.id, user, viewer)
 
 
-page_view_signal = Signal(providing_args=["user", "page"])
+page_view_signal = Signal(providing_args=["user", "page", "viewer"])
 
 
 @receiver(page_view_signal, sender=Page)
-def add_page_view(sender, user, page, **kwargs):
-    page.num_views = F("num_views") + 1
-    page.save(update_fields=["num_views"])
+def add_page_view(sender, user, page, viewer=None, **kwargs):
+    view_buffer.add(Page, page.id, user, viewer)
+
+
+@receiver(post_save, sender=Meme)
+def count_meme_tags(sender, instance, created, **kwargs):
+    if created:
+        count_tags(instance, 1)
+
 
-    View.objects.create(user=user if user.is_authenticated else None, content_object=page)
+@receiver(pre_delete, sender=Meme)
+def uncount_meme_tags(sender, instance, **kwargs):
+    count_tags(instance, -1)
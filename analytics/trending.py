@@ -0,0 +1,155 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.fields.json import KeyTransform
+from django.utils import timezone
+
+from .models import TagCount, Trending
+
+from datetime import timedelta
+
+
+"""
+Tags of public memes are counted per hour as memes are uploaded and deleted
+so that trending tags are computed from a week of hourly counts instead of a week of memes
+
+Tags are counted in scopes: all memes (""), memes in a category ("category:<name>"),
+and memes in a public page ("page:<name>")
+"""
+
+# Key of advisory lock held while refreshing trending tags
+REFRESH_LOCK_ID = 31415926
+
+UPSERT_TAG_COUNTS = """
+INSERT INTO analytics_tagcount (scope, tag, bucket, count) VALUES (%s, %s, %s, %s)
+ON CONFLICT (scope, tag, bucket) DO UPDATE SET count = analytics_tagcount.count + EXCLUDED.count
+"""
+
+# Top tags of every scope in one pass, recent = more points
+TOP_TAGS = """
+SELECT scope, tag FROM (
+    SELECT scope, tag, row_number() OVER (
+        PARTITION BY scope
+        ORDER BY sum(count * CASE WHEN bucket >= %(hrs3)s THEN 10 WHEN bucket >= %(days2)s THEN 7 ELSE 2 END) DESC, tag
+    ) AS rank
+    FROM analytics_tagcount
+    WHERE bucket > %(week)s
+    GROUP BY scope, tag
+    HAVING sum(count) > 0
+) t
+WHERE rank <= %(num_tags)s
+ORDER BY scope, rank
+"""
+
+
+def get_category_scope(name: str) -> str:
+    return f"category:{name}"
+
+
+def get_page_scope(name: str) -> str:
+    return f"page:{name}"
+
+
+def get_meme_scopes(meme) -> list:
+    scopes = [""]
+    if meme.category_id:
+        scopes.append(get_category_scope(meme.category.name))
+    if meme.page_name:
+        scopes.append(get_page_scope(meme.page_name))
+
+    return scopes
+
+
+def get_tag_count_rows(meme, change: int) -> list:
+    if meme.private or meme.page_private or meme.hidden or not meme.tags_lower:
+        return []
+
+    bucket = meme.upload_date.replace(minute=0, second=0, microsecond=0)
+    # Counts older than a week aren't used
+    if bucket < timezone.now() - timedelta(weeks=1, hours=1):
+        return []
+
+    return [(scope, tag, bucket, change) for scope in get_meme_scopes(meme) for tag in meme.tags_lower]
+
+
+def upsert_tag_counts(rows: list):
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(UPSERT_TAG_COUNTS, rows)
+
+
+def count_tags(meme, change: int):
+    """ Add (1) or remove (-1) tags of a meme from counts """
+    upsert_tag_counts(get_tag_count_rows(meme, change))
+
+
+def count_tags_of_memes(memes, change: int):
+    """
+    Add (1) or remove (-1) tags of memes in queryset from counts,
+    e.g. before memes are hidden or their page becomes private, or after their page becomes public
+    """
+    memes = memes.filter(upload_date__gte=timezone.now()-timedelta(weeks=1, hours=1)) \
+                 .select_related("category") \
+                 .only("private", "page_private", "hidden", "tags_lower", "upload_date", "page_name", "category__name")
+
+    upsert_tag_counts([row for meme in memes for row in get_tag_count_rows(meme, change)])
+
+
+def get_trending_tags(num_tags: int = 10) -> dict:
+    """ Get most used tags in the past week of each scope, weighted by how recently they were used """
+    now = timezone.now()
+
+    with connection.cursor() as cursor:
+        cursor.execute(TOP_TAGS, {
+            "hrs3": now - timedelta(hours=3),
+            "days2": now - timedelta(days=2),
+            "week": now - timedelta(weeks=1),
+            "num_tags": num_tags
+        })
+        rows = cursor.fetchall()
+
+    tags = {}
+    for scope, tag in rows:
+        tags.setdefault(scope, []).append(tag)
+
+    return tags
+
+
+def get_trending(scope: str = ""):
+    """ Get (timestamp, tags) of latest trending tags of scope (without reading other scopes) or None """
+    tags = F("data") if not scope else KeyTransform(scope, "scopes")
+    trending = Trending.objects.annotate(tags=tags).values_list("timestamp", "tags").last()
+    if trending is None:
+        return None
+
+    return trending[0], trending[1] or []
+
+
+def prune_tag_counts():
+    """ Delete counts that are too old to be used """
+    TagCount.objects.filter(bucket__lt=timezone.now()-timedelta(weeks=1, hours=1)).delete()
+
+
+def refresh_trending(max_age: timedelta, scope: str = ""):
+    """
+    Compute and save trending tags of all scopes if they are older than max_age
+
+    Only one worker refreshes at a time (others return None straight away and keep serving old data),
+    returns new trending tags of scope or None if another worker is refreshing them
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [REFRESH_LOCK_ID])
+            if not cursor.fetchone()[0]:
+                return None
+
+        # Another worker may have refreshed before lock was acquired
+        latest = get_trending(scope)
+        if latest and latest[0] >= timezone.now() - max_age:
+            return latest[1]
+
+        tags = get_trending_tags()
+        new_trending = Trending.objects.create(data=tags.pop("", []), scopes=tags)
+        Trending.objects.filter(id__lt=new_trending.id).delete()
+        prune_tag_counts()
+
+    return new_trending.data if not scope else new_trending.scopes.get(scope, [])
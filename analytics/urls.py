@@ -6,6 +6,7 @@ from . import views
 
 urlpatterns = [
     path("trending", views.trending, name="trending"),
+    path("views/<str:obj>/<str:identifier>", views.view_counts, name="view_counts"),
     path("admin", views.admin, name="admin"),
 ]
 
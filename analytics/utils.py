@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from .models import UniqueViewSketch
+from .hll import HyperLogLog
+
+
+def get_viewer_id(request) -> str:
+    """ Identify viewer for counting unique viewers (user ID, or IP address if not logged in) """
+    if request.user.is_authenticated:
+        return f"u{request.user.id}"
+
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
+
+    return f"a{ip}"
+
+
+def get_unique_viewers(obj) -> int:
+    """ Estimate number of unique viewers of meme, page, or profile by merging daily sketches (cached) """
+    content_type = ContentType.objects.get_for_model(obj)
+    key = f"unique_viewers:{content_type.id}:{obj.id}"
+
+    count = cache.get(key)
+    if count is None:
+        hll = HyperLogLog()
+        for registers in UniqueViewSketch.objects.filter(content_type=content_type, object_id=obj.id) \
+                                                 .values_list("registers", flat=True):
+            hll.merge(HyperLogLog.from_bytes(registers))
+
+        count = hll.count()
+        cache.set(key, count, settings.UNIQUE_VIEWERS_CACHE_TIMEOUT)
+
+    return count
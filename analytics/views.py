@@ -1,52 +1,81 @@
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 # from django.views.decorators.cache import cache_page
 
-from .models import Trending, AdminHoneypot
-from memes.models import Meme
+from .models import AdminHoneypot
+from .trending import get_trending, refresh_trending, get_category_scope, get_page_scope
+from .rollups import get_view_counts
+from memes.models import Category, Meme, Page, Profile
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 from datetime import timedelta
 
 
 @api_view(["GET"])
 def trending(request):
-    """ Get list of most popular hashtags """
+    """ Get list of most popular hashtags (of all memes, category c, or page p) """
 
-    try:
-        t = Trending.objects.last()
-        data = t.data
-        create_new_data = t.timestamp < timezone.now() - timedelta(hours=1)
-    except Trending.DoesNotExist:
-        # Should only get here the first ever time this view is called
-        data = []
-        create_new_data = True
-
-    if create_new_data:
-        new_trending = Trending.objects.create(data=data)
-
-        now = timezone.now()
-        hrs3 = now - timedelta(hours=3)
-        days2 = now - timedelta(days=2)
-
-        tags_data = Meme.objects.filter(private=False, page_private=False, upload_date__gt=now-timedelta(weeks=1)) \
-                                .values_list("tags_lower", "upload_date")
-
-        points = {}
-        for tags, timestamp in tags_data:
-            # Calculate points for tags based on when they were used (more recent = more points)
-            point = 2 if timestamp < days2 else 7 if timestamp < hrs3 else 10
-            for tag in tags:
-                points[tag] = points.get(tag, 0) + point
-
-        data = sorted(points, key=points.get, reverse=True)[:10]
-        new_trending.data = data
-        new_trending.save(update_fields=["data"])
+    category_name = request.query_params.get("c")
+    page_name = request.query_params.get("p")
+
+    if category_name:
+        if category_name not in Category.Name.values:
+            raise NotFound
+        scope = get_category_scope(category_name)
+    elif page_name:
+        scope = get_page_scope(page_name)
+    else:
+        scope = ""
+
+    t = get_trending(scope)
+    data = t[1] if t else []
+
+    # Old data is returned while another request refreshes it
+    if t is None or t[0] < timezone.now() - settings.TRENDING_MAX_AGE:
+        new_data = refresh_trending(settings.TRENDING_MAX_AGE, scope)
+        if new_data is not None:
+            data = new_data
 
     return JsonResponse(data, safe=False)
 
 
+def get_own_object(user, obj: str, identifier: str):
+    """ Get meme, page, or profile of user to show analytics for """
+    if obj == "meme":
+        return get_object_or_404(Meme.all_objects.only("id"), uuid=identifier, user=user)
+    elif obj == "page":
+        return get_object_or_404(Page.objects.only("id"), name=identifier, admin=user)
+    elif obj == "profile" and identifier == user.username:
+        return Profile.objects.only("id").get(user=user)
+
+    raise NotFound
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def view_counts(request, obj, identifier):
+    """ Number of views per hour or day (period) in the past number of days of user's meme, page, or profile """
+    period = request.query_params.get("period", "day")
+    try:
+        days = int(request.query_params.get("days", 30))
+    except ValueError:
+        raise ParseError
+
+    if period not in ("hour", "day") or not 0 < days <= 365:
+        raise ParseError
+
+    # Read from rollups only (raw views are deleted after VIEW_RETENTION_DAYS)
+    counts = get_view_counts(get_own_object(request.user, obj, identifier), period, timezone.now()-timedelta(days=days))
+
+    return Response({"views": [{"bucket": bucket, "count": count} for bucket, count in counts]})
+
+
 @api_view(["GET"])
 def admin(request):
     """ Fake admin site, respond ONLY with errors """
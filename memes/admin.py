@@ -15,3 +15,5 @@ admin.site.register(Subscriber)
 admin.site.register(SubscribeRequest)
 admin.site.register(InviteLink)
 admin.site.register(ModeratorInvite)
+admin.site.register(FeedItem)
+admin.site.register(MemeVoteDelta)
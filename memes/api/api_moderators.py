@@ -4,6 +4,7 @@ from django.db.models import F
 from django.db import transaction, IntegrityError
 
 from memes.models import Page, User, ModeratorInvite, Meme, Comment
+from notifications.models import NotificationCounter
 
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
@@ -30,14 +31,18 @@ def invite_moderators(request, name):
     if current_pending_count + len(usernames) > 50:
         return HttpResponseBadRequest("Can only have 50 moderators")
 
-    users = User.objects.only("id").filter(username__in=usernames)
+    users = User.objects.only("id", "username").filter(username__in=usernames)
 
     try:
-        ModeratorInvite.objects.bulk_create([ModeratorInvite(invitee=user, page=page) for user in users])
+        with transaction.atomic():
+            ModeratorInvite.objects.bulk_create([ModeratorInvite(invitee=user, page=page) for user in users])
     except IntegrityError:
         return HttpResponseBadRequest("Moderator(s) already exist")
 
-    return Response(users.values_list("username", flat=True))
+    # Deleted invites are counted in notifications.signals
+    NotificationCounter.add("invites", {user.id: 1 for user in users})
+
+    return Response([user.username for user in users])
 
 
 class PendingModeratorsAdmin(APIView):
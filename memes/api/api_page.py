@@ -2,9 +2,13 @@ from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.db.models import F, Q
 from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
 
 from memes.models import Page, SubscribeRequest, User, InviteLink
+from memes.cache import get_response_cache_key
 from analytics.signals import page_view_signal
+from analytics.utils import get_viewer_id, get_unique_viewers
 
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
@@ -17,6 +21,13 @@ from string import ascii_letters
 
 @api_view(["GET"])
 def page(request, name):
+    cache_key = get_response_cache_key(request, f"page:{name}")
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            page_view_signal.send(sender=Page, user=request.user, page=Page(id=cached["id"]), viewer=get_viewer_id(request))
+            return Response(cached["response"])
+
     try:
         page = Page.objects.annotate(adm=F("admin__username")).defer("created", "nsfw").get(name=name)
     except Page.DoesNotExist:
@@ -34,7 +45,8 @@ def page(request, name):
             "permissions": page.permissions,
             "subs": page.num_subscribers,
             "num_posts": page.num_posts,
-            "admin": page.adm
+            "admin": page.adm,
+            "unique_viewers": get_unique_viewers(page)
         }
     }
 
@@ -54,7 +66,10 @@ def page(request, name):
         mods.remove(page.adm)
         response["page"]["moderators"] = mods
 
-    page_view_signal.send(sender=page.__class__, user=request.user, page=page)
+    page_view_signal.send(sender=page.__class__, user=request.user, page=page, viewer=get_viewer_id(request))
+
+    if cache_key:
+        cache.set(cache_key, {"id": page.id, "response": response}, settings.RESPONSE_CACHE_TIMEOUT)
 
     return Response(response)
 
@@ -4,9 +4,11 @@ from django.db.models import F, Q
 
 from memes.serializers import ProfileMemesSerializer, UserMemesSerializer, ProfileCommentsSerializer
 from memes.models import User, Page, Meme, Comment, Profile
+from memes.pagination import CountlessPagination
 from analytics.signals import profile_view_signal
+from analytics.utils import get_viewer_id, get_unique_viewers
 
-from rest_framework import viewsets, pagination
+from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
@@ -30,7 +32,7 @@ def user_page(request, username):
         username = get_object_or_404(User.objects.values_list("username", flat=True), username__iexact=username)
         return JsonResponse({"redirect": True, "username": username})
 
-    profile_view_signal.send(sender=profile.__class__, user=request.user, profile=profile)
+    profile_view_signal.send(sender=profile.__class__, user=request.user, profile=profile, viewer=get_viewer_id(request))
 
     if user.banned:
         return JsonResponse({"banned": True})
@@ -44,19 +46,14 @@ def user_page(request, username):
         "clout": profile.clout,
         "num_followers": profile.num_followers,
         "num_following": profile.num_following,
+        "unique_viewers": get_unique_viewers(profile),
         "moderating": Page.objects.filter(moderators=user).annotate(dname=F("display_name")).values("name", "dname", "private")
     })
 
 
-class ProfileMemesPagination(pagination.PageNumberPagination):
+class ProfileMemesPagination(CountlessPagination):
     page_size = 15
 
-    def get_paginated_response(self, data):
-        return Response({
-            "next": self.get_next_link(),
-            "results": data
-        })
-
 
 class ProfileMemesViewSet(viewsets.ReadOnlyModelViewSet):
     """ Get memes on profile page """
@@ -93,7 +90,7 @@ class UserMemesViewSet(ProfileMemesViewSet):
             raise NotFound
 
         return Meme.objects.only("uuid", "original", "thumbnail") \
-                           .filter(user=user, private=False, page_private=False) \
+                           .filter(user=user, private=False, page_private=False, processing_state=Meme.ProcessingState.READY) \
                            .order_by("-id")
 
         """
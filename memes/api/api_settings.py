@@ -1,8 +1,9 @@
 from django.http import HttpResponse, Http404, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 
-from memes.models import User, Page
+from memes.models import User, Page, FeedItem
 from memes.utils import check_file_ext
+from analytics.trending import count_tags_of_memes
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -156,6 +157,7 @@ class PageSettings(APIView):
                 page.description = request.POST["description"][:150].strip()
 
             if "private" in update_fields:
+                was_private = page.private
                 new_private = request.POST["private"] == "true"
                 page.private = new_private
 
@@ -166,8 +168,18 @@ class PageSettings(APIView):
 
             # Update cached values of all memes posted to this page (page_private)
             if "private" in update_fields:
+                # Tags of memes on private pages aren't counted in trending tags
+                if new_private and not was_private:
+                    count_tags_of_memes(page.meme_set.all(), -1)
+
                 page.meme_set.update(page_private=new_private)
 
+                if new_private:
+                    # Followers who aren't subscribed can't see memes on private pages
+                    FeedItem.page_made_private(page.id)
+                elif was_private:
+                    count_tags_of_memes(page.meme_set.all(), 1)
+
         return HttpResponse()
 
     def delete(self, request, name):
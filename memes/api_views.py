@@ -1,4 +1,8 @@
-from django.db.models import F, Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.shortcuts import get_object_or_404
 from django.http import QueryDict
 from django.utils.dateparse import parse_datetime
@@ -6,8 +10,10 @@ from django.utils.dateparse import parse_datetime
 
 from .serializers import *
 from .models import *
+from .pagination import KeysetPagination, CountlessPagination, NotificationPagination
+from .cache import get_response_cache_key, get_user_votes
 
-from rest_framework import viewsets, pagination, filters
+from rest_framework import viewsets, filters
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import NotAuthenticated, ParseError, PermissionDenied, NotFound
@@ -20,50 +26,25 @@ def join_votes_with_data(data: list, user_id: int, object_name: str) -> list:
     """
     Get likes/dislikes for memes or comments in data then add to data
     """
-    assert object_name in ("meme", "comment")
-
-    # Get meme or comment uuids from data
-    uuids = [obj["uuid"] for obj in data]
-    # Get votes for those memes/comments for that user
-    if object_name == "meme":
-        votes = MemeLike.objects.filter(user_id=user_id, meme_uuid__in=uuids).values("meme_uuid", "point")
-    else:
-        votes = CommentLike.objects.filter(user_id=user_id, comment_uuid__in=uuids).values("comment_uuid", "point")
+    # Get votes for those memes/comments for that user (cached if user voted or loaded them recently)
+    votes = get_user_votes(user_id, object_name, [obj["uuid"] for obj in data])
     # Add "vote" key and point (1 or -1) value to meme/comment in data
-    indexes = {uuid: i for i, uuid in enumerate(uuids)}
-    for vote in votes:
-        i = indexes[vote[f"{object_name}_uuid"]]
-        data[i]["vote"] = vote["point"]
+    for obj in data:
+        if votes[obj["uuid"]]:
+            obj["vote"] = votes[obj["uuid"]]
 
     return data
 
 
-class MemePagination(pagination.PageNumberPagination):
+class MemePagination(KeysetPagination):
     page_size = 20
 
-    def add_before_query_param(self):
-        """ Check if should add "before" query parameter """
-        return self.get_next_link() and "before" not in self.request.query_params and "page" not in self.request.query_params
-
-    def get_next_meme_link(self, uuid):
-        """
-        Add "before" query param to prevent duplicates
-        e.g. new memes uploaded before loading next page will cause duplicates
-        """
-        if self.request.query_params.get("p") and self.add_before_query_param():
-            # Get upload or post date of first object
-            before = Meme.objects.values_list("upload_date", flat=True).get(uuid=uuid)
-            # Add "before" query param to next link
-            return f"{self.get_next_link()}&{urlencode({'before': before})}"
-
-        return self.get_next_link()
-
     def get_paginated_response(self, data):
         if self.request.user.is_authenticated:
             data = join_votes_with_data(data, self.request.user.id, "meme")
 
         return Response({
-            "next": self.get_next_meme_link(data[0]["uuid"]) if data else None,
+            "next": self.get_next_link(),
             "results": data
         })
 
@@ -71,18 +52,57 @@ class MemePagination(pagination.PageNumberPagination):
 class MemeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MemeSerializer
     pagination_class = MemePagination
+    sort_orderings = {
+        "new": MemePagination.ordering,
+        "hot": ("-hot_score", "-id"),
+        "top": ("-points", "-id"),
+    }
+
+    # Query params that change response for anonymous users
+    cache_query_params = ("p", "q", "sort", "match", "name", "cursor", "before")
+
+    def list(self, request, *args, **kwargs):
+        """ Cache responses for anonymous users """
+        cache_key = get_response_cache_key(request, "memes", self.cache_query_params)
+        if cache_key:
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+
+        if cache_key:
+            cache.set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return response
+
+    def get_sort(self):
+        """ Get sort mode from "sort" query param (hot, top, or new) """
+        sort = self.request.query_params.get("sort", "new")
+        if sort not in self.sort_orderings:
+            raise ParseError
+
+        return sort
+
+    def get_cursor_ordering(self):
+        # Order search by caption by relevance unless sort mode is chosen
+        if (self.request.query_params.get("p") == "search" and "sort" not in self.request.query_params
+                and not self.get_search_tags(self.get_search_query())):
+            return ("-rank", "-id")
+
+        return self.sort_orderings[self.get_sort()]
 
     def get_before(self, memes):
         """ Get memes before certain datetime """
         if "before" in self.request.query_params:
             return memes.filter(upload_date__lte=parse_datetime(self.request.query_params["before"]))
 
-        # Don't get memes uploaded within past minute (allow time for files to get resized)
-        return memes.filter(upload_date__lt=timezone.now()-timedelta(minutes=1))
+        return memes
 
     def get_meme_queryset(self, before=True):
         """ Select correct fields and filter memes before certain datetime """
-        memes = Meme.objects.only(
+        # Only show memes after files are resized (uses partial index)
+        memes = Meme.objects.filter(processing_state=Meme.ProcessingState.READY).only(
             "username",
             "user_image",
             "page_name",
@@ -92,9 +112,14 @@ class MemeViewSet(viewsets.ReadOnlyModelViewSet):
             "uuid",
             "caption",
             "points",
-            "num_comments"
+            "num_comments",
+            "hot_score"
         )
 
+        # Only show top memes from the same period that hot scores are calculated for
+        if self.get_sort() == "top":
+            memes = memes.filter(upload_date__gt=timezone.now()-settings.HOT_SCORE_WINDOW)
+
         return self.get_before(memes) if before else memes
 
     def get_queryset(self):
@@ -118,8 +143,7 @@ class MemeViewSet(viewsets.ReadOnlyModelViewSet):
             # Show memes from followed users and subscribed pages
             # Don't show memes from private pages that user is not subscribed to
             if self.request.user.is_authenticated:
-                return memes.filter(Q(user__followers=self.request.user)|Q(page__subscribers=self.request.user)) \
-                            .exclude(Q(page_private=True)&~Q(page__subscribers=self.request.user)).distinct()
+                return memes.filter(FeedItem.get_feed_filter(self.request.user))
 
             raise NotAuthenticated()
 
@@ -135,16 +159,49 @@ class MemeViewSet(viewsets.ReadOnlyModelViewSet):
             return memes.filter(category__name=category_name)
 
         elif pathname == "search":
-            query = self.request.query_params.get("q", "")[:64].strip()
+            query = self.get_search_query()
             if query:
-                tags = [t.lower() for t in re.findall("#([a-zA-Z][a-zA-Z0-9_]*)", query)]
+                tags = self.get_search_tags(query)
                 if tags:
-                    return memes.filter(tags_lower__contains=tags)
+                    return self.filter_tags(memes, tags)
 
-                return memes.filter(caption__icontains=query).distinct() # Return search by caption
+                # Return search by caption, match start of each word in query
+                words = re.findall(r"\w+", query)[:8]
+                if words:
+                    search = SearchQuery(" & ".join(f"{w}:*" for w in words), search_type="raw", config="simple")
+                    # ts_rank returns real, cast to double so that rank in cursor compares equal to rank of last meme
+                    return memes.filter(search_vector=search) \
+                                .annotate(rank=Cast(SearchRank(F("search_vector"), search), FloatField()))
 
         raise NotFound
 
+    def filter_tags(self, memes, tags):
+        """ Get memes with all tags (default) or any of the tags using "match" query param """
+        match = self.request.query_params.get("match", "all")
+        if match == "all":
+            return memes.filter(tags_lower__contains=tags)
+        elif match == "any":
+            return memes.filter(tags_lower__overlap=tags)
+
+        raise ParseError
+
+    def get_search_query(self):
+        return self.request.query_params.get("q", "")[:64].strip()
+
+    def get_search_tags(self, query):
+        return [t.lower() for t in re.findall("#([a-zA-Z][a-zA-Z0-9_]*)", query)]
+
+
+class TagMemeViewSet(MemeViewSet):
+    """ Get memes with a single tag, e.g. /api/tags/funny """
+
+    def get_queryset(self):
+        tag = self.kwargs["tag"]
+        if not re.search("^[a-zA-Z][a-zA-Z0-9_]{0,63}$", tag):
+            raise NotFound
+
+        return self.get_meme_queryset().filter(private=False, page_private=False, tags_lower__contains=[tag.lower()])
+
 
 class PageMemeViewSet(MemeViewSet):
     def get_page_name(self):
@@ -174,7 +231,7 @@ class PrivatePageMemeViewSet(PageMemeViewSet):
         return self.get_meme_queryset().filter(page=page)
 
 
-class CommentPagination(pagination.PageNumberPagination):
+class CommentPagination(CountlessPagination):
     page_size = 20
 
     def add_before_query_param(self):
@@ -257,15 +314,9 @@ class ReplyViewSet(viewsets.ReadOnlyModelViewSet):
         ).filter(root_id=comment_id).order_by("id")
 
 
-class SearchListPagination(pagination.PageNumberPagination):
+class SearchListPagination(CountlessPagination):
     page_size = 15
 
-    def get_paginated_response(self, data):
-        return Response({
-            "next": self.get_next_link(),
-            "results": data
-        })
-
 
 class SearchUserViewSet(viewsets.ReadOnlyModelViewSet):
     model = User
@@ -288,16 +339,6 @@ class SearchPageViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ["name", "display_name"]
 
 
-class NotificationPagination(pagination.PageNumberPagination):
-    page_size = 20
-
-    def get_paginated_response(self, data):
-        return Response({
-            "next": self.get_next_link(),
-            "results": data
-        })
-
-
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     model = Notification
     serializer_class = NotificationSerializer
@@ -305,4 +346,4 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by("-timestamp")
+        return Notification.objects.filter(recipient=self.request.user)
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.conf import settings
+from django.db import transaction
+
+from .models import MemeLike, CommentLike
+
+from hashlib import md5
+from urllib.parse import urlencode
+
+
+"""
+Cached responses are grouped into scopes (e.g. "memes", "meme:<uuid>", "page:<name>")
+Each scope has a version number in its cache keys so that invalidating a scope
+is a single increment instead of finding and deleting every key
+"""
+
+
+def get_scope_version(scope: str) -> int:
+    return cache.get_or_set(f"version:{scope}", 1, None)
+
+
+def invalidate_scopes(*scopes: str):
+    for scope in scopes:
+        try:
+            cache.incr(f"version:{scope}")
+        except ValueError:
+            pass    # Nothing cached for scope yet
+
+
+def get_response_cache_key(request, scope: str, query_params: tuple = ()):
+    """ Get cache key for response to anonymous user, returns None if user is logged in """
+    if request.user.is_authenticated:
+        return None
+
+    params = urlencode([(p, request.query_params[p]) for p in query_params if p in request.query_params])
+    # Responses include fallback URLs if browser doesn't accept WEBP
+    webp = "image/webp" in request.headers.get("Accept", "")
+
+    return f"response:{scope}:{get_scope_version(scope)}:{md5(f'{request.path}?{params}:{webp}'.encode()).hexdigest()}"
+
+
+"""
+Votes of each user are cached per meme/comment so that pages of memes/comments
+don't need an extra query to get votes, 0 is cached if user hasn't voted
+"""
+
+
+def get_vote_cache_key(user_id: int, object_name: str, uuid: str) -> str:
+    return f"vote:{object_name}:{user_id}:{uuid}"
+
+
+def get_user_votes(user_id: int, object_name: str, uuids: list) -> dict:
+    """ Get votes (1, -1, or 0) for memes or comments, only query database for uncached votes """
+    assert object_name in ("meme", "comment")
+
+    keys = {get_vote_cache_key(user_id, object_name, uuid): uuid for uuid in uuids}
+    votes = {keys[key]: point for key, point in cache.get_many(keys).items()}
+
+    missing = [uuid for uuid in uuids if uuid not in votes]
+    if missing:
+        if object_name == "meme":
+            points = MemeLike.objects.filter(user_id=user_id, meme_uuid__in=missing).values_list("meme_uuid", "point")
+        else:
+            points = CommentLike.objects.filter(user_id=user_id, comment_uuid__in=missing).values_list("comment_uuid", "point")
+
+        fetched = {uuid: 0 for uuid in missing}
+        fetched.update(points)
+        # Add instead of set so that a vote cached by cache_vote since the query isn't overwritten
+        for uuid, point in fetched.items():
+            cache.add(get_vote_cache_key(user_id, object_name, uuid), point, settings.VOTE_CACHE_TIMEOUT)
+        votes.update(fetched)
+
+    return votes
+
+
+def cache_vote(user_id: int, object_name: str, uuid: str, point: int):
+    """ Write new vote through to cache after it is saved (point is 0 if vote is deleted) """
+    key = get_vote_cache_key(user_id, object_name, uuid)
+    transaction.on_commit(lambda: cache.set(key, point, settings.VOTE_CACHE_TIMEOUT))
+
+
+"""
+Reason an upload failed is cached after its meme is deleted so that the uploader can still be told why
+"""
+
+
+def get_upload_failure_key(uuid: str) -> str:
+    return f"upload_failure:{uuid}"
+
+
+def cache_upload_failure(uuid: str, user_id: int, message: str):
+    cache.set(get_upload_failure_key(uuid), {"user": user_id, "message": message}, settings.UPLOAD_STATUS_TIMEOUT)
+
+
+def get_upload_failure(uuid: str, user_id: int):
+    """ Get reason upload of user failed or None """
+    failure = cache.get(get_upload_failure_key(uuid))
+    if failure is None or failure["user"] != user_id:
+        return None
+
+    return failure["message"]
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+import time
+
+
+class IntervalCommand(BaseCommand):
+    """
+    Command that runs once, or keeps running every --interval seconds when started in the background
+
+    Subclasses implement run_once instead of handle
+    """
+    interval_help = "Keep running every INTERVAL seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help=self.interval_help)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(**options)
+
+            if options["interval"] is None:
+                break
+
+            time.sleep(options["interval"])
+
+    def run_once(self, **options):
+        raise NotImplementedError("subclasses of IntervalCommand must provide a run_once() method")
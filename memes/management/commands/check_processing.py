@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.utils import timezone
+
+from memes.management.base import IntervalCommand
+from memes.models import Meme, PendingUpload
+
+from datetime import timedelta
+
+
+class Command(IntervalCommand):
+    help = (
+        "Mark pending memes as ready when their resized files exist, or delete them as failed if they take too long "
+        "(catches memes whose callbacks were lost, e.g. server restarted while processing), "
+        "and delete files of uploads that were never completed (run with --interval 60)"
+    )
+
+    interval_help = "Keep checking every INTERVAL seconds"
+
+    def run_once(self, **options):
+        self.check()
+        self.clean_uploads()
+
+    def check(self):
+        give_up = timezone.now() - timedelta(seconds=settings.MEDIA_PROCESSING_GIVE_UP)
+        memes = Meme.all_objects.filter(processing_state=Meme.ProcessingState.PENDING) \
+                                .only("original", "large", "thumbnail", "upload_date", "page_name")
+
+        for meme in memes:
+            # Thumbnail name is set once processing starts
+            files = [meme.get_processed_original_name()] + [f.name for f in (meme.large, meme.thumbnail) if f]
+            if meme.thumbnail and all(default_storage.exists(name) for name in files):
+                meme.processing_done({"statusCode": 200})
+            elif meme.upload_date < give_up:
+                meme.processing_done({"statusCode": 500})
+
+    def clean_uploads(self):
+        # Uploads can't be completed after token expires
+        expired = timezone.now() - timedelta(seconds=settings.UPLOAD_TOKEN_MAX_AGE)
+
+        for upload in PendingUpload.objects.filter(created__lt=expired).order_by("id")[:1000]:
+            # Claim first so that a request completing upload at the same time can't create meme with deleted file
+            if PendingUpload.claim(upload.user_id, upload.key) and default_storage.exists(upload.key):
+                default_storage.delete(upload.key)
@@ -0,0 +1,36 @@
+from memes.management.base import IntervalCommand
+from memes.models import MemeLike, MemeVoteDelta
+from memes.cache import invalidate_scopes
+from notifications.signals import meme_voted_signal, is_like_milestone
+
+
+class Command(IntervalCommand):
+    help = "Apply vote counter changes in batches (run in background, e.g. with --interval 1)"
+
+    interval_help = "Keep flushing every INTERVAL seconds"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def run_once(self, **options):
+        # Flush until there are no deltas left
+        while self.flush(options["batch_size"]) == options["batch_size"]:
+            pass
+
+    def flush(self, batch_size):
+        num_deltas, results = MemeVoteDelta.flush(batch_size)
+
+        like_ids = [like_id for *_, likes in results for like_id in likes]
+        likes = MemeLike.objects.only("user").in_bulk(like_ids)
+
+        for meme, old_points, new_points, meme_like_ids in results:
+            invalidate_scopes(f"meme:{meme.uuid}")
+
+            # Notify about the latest like by another user if a milestone was passed
+            meme_likes = [likes[i] for i in meme_like_ids if i in likes and likes[i].user_id != meme.user_id]
+            milestones = [p for p in range(max(old_points, 0) + 1, new_points + 1) if is_like_milestone(p)]
+            if meme_likes and milestones:
+                meme_voted_signal.send(sender=MemeLike, instance=meme_likes[-1], meme=meme, points=milestones[-1])
+
+        return num_deltas
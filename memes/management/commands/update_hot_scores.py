@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from memes.management.base import IntervalCommand
+from memes.models import Meme
+from memes.utils import get_hot_score
+
+
+class Command(IntervalCommand):
+    help = "Recalculate hot scores of recent memes (run periodically, e.g. every 5 minutes or with --interval 300)"
+
+    interval_help = "Keep updating every INTERVAL seconds"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def run_once(self, **options):
+        now = timezone.now()
+        cutoff = now - settings.HOT_SCORE_WINDOW
+        batch_size = options["batch_size"]
+
+        memes = Meme.all_objects.filter(upload_date__gt=cutoff).only("points", "upload_date", "hot_score")
+
+        batch = []
+        for meme in memes.iterator(chunk_size=batch_size):
+            meme.hot_score = get_hot_score(meme.points, (now - meme.upload_date).total_seconds() / 3600)
+            batch.append(meme)
+
+            if len(batch) == batch_size:
+                Meme.all_objects.bulk_update(batch, ["hot_score"])
+                batch = []
+
+        Meme.all_objects.bulk_update(batch, ["hot_score"])
+
+        # Reset memes that are now too old to be hot
+        reset = Meme.all_objects.filter(Q(hot_score__gt=0)|Q(hot_score__lt=0), upload_date__lte=cutoff) \
+                                .update(hot_score=0)
+
+        self.stdout.write(f"Updated hot scores, reset {reset} old memes")
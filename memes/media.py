@@ -0,0 +1,338 @@
+from django.conf import settings
+from django.db import close_old_connections
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+
+from PIL import Image, ImageOps
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+
+import boto3
+from botocore.config import Config
+
+
+"""
+Resizing and checking media files runs on a backend set by MEDIA_PROCESSING_BACKEND
+
+Tasks are named after the Lambda functions that originally ran them and take the same payloads,
+tasks that are waited for return a response like {"statusCode": 200} or {"statusCode": 418, "errorMessage": "..."}
+and callbacks are called with the same response in a thread of this process when tasks finish
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class MediaProcessingError(Exception):
+    pass
+
+
+class LambdaBackend:
+    """ Invoke AWS Lambda function for each task """
+
+    # Number of invocations with callbacks waited for at once (others wait in queue)
+    max_waiting = 20
+
+    def __init__(self):
+        # Wait as long as a function can run and don't retry (a retried resize could succeed but be reported as failed)
+        self.client = boto3.client("lambda", region_name=settings.AWS_S3_REGION_NAME, config=Config(
+            read_timeout=settings.MEDIA_PROCESSING_TIMEOUT,
+            retries={"max_attempts": 0}
+        ))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_waiting, thread_name_prefix="media-lambda")
+
+    def process(self, task: str, payload: dict, wait: bool = False, callback=None):
+        """
+        callback is called with response when function finishes (function is waited for in a thread),
+        callbacks are lost if server stops first so see check_processing command too
+        """
+        if callback is not None and not wait:
+            self.executor.submit(self.invoke_and_call, task, payload, callback)
+            return
+
+        response = self.invoke(task, payload, "RequestResponse" if wait else "Event")
+
+        if wait:
+            return json.loads(response["Payload"].read())
+
+    def invoke(self, task: str, payload: dict, invocation_type: str):
+        return self.client.invoke(
+            FunctionName=task,
+            InvocationType=invocation_type,
+            Payload=json.dumps(payload),
+            Qualifier="$LATEST"
+        )
+
+    def invoke_and_call(self, task: str, payload: dict, callback):
+        try:
+            response = self.invoke(task, payload, "RequestResponse")
+            result = {"statusCode": 500} if "FunctionError" in response else json.loads(response["Payload"].read() or "null")
+        except Exception:
+            logger.exception("Media processing task failed")
+            result = {"statusCode": 500}
+
+        # Resize functions don't return a response when they succeed
+        if not isinstance(result, dict) or "statusCode" not in result:
+            result = {"statusCode": 200}
+
+        run_callback(callback, result)
+
+
+class LocalBackend:
+    """
+    Run tasks with Pillow and ffmpeg in a pool of worker processes on this server
+
+    At most MEDIA_PROCESSING_WORKERS tasks run at once and at most MEDIA_PROCESSING_QUEUE_SIZE more wait in the queue
+    (tasks sent when queue is full fail straight away), each task is stopped after MEDIA_PROCESSING_TIMEOUT seconds
+    """
+
+    def __init__(self):
+        self.workers = settings.MEDIA_PROCESSING_WORKERS
+        self.timeout = settings.MEDIA_PROCESSING_TIMEOUT
+        self.slots = threading.BoundedSemaphore(self.workers + settings.MEDIA_PROCESSING_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get_executor(self):
+        with self.lock:
+            # Create pool on first task, since a pool created on import in a preforking server's master
+            # would leave each worker with a copy whose management thread and result pipes don't work
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=setup_worker
+                )
+
+            return self.executor
+
+    def process(self, task: str, payload: dict, wait: bool = False, callback=None):
+        """ callback is called with response when task finishes """
+        if task not in TASKS:
+            raise MediaProcessingError(f"Unknown task {task}")
+
+        # Don't make request wait for space in queue, task fails straight away instead
+        if not self.slots.acquire(blocking=False):
+            logger.error("Media processing queue is full, could not start %s", task)
+            return self.fail({"statusCode": 503, "errorMessage": "Server is busy, please try again later"}, wait, callback)
+
+        try:
+            future = self.get_executor().submit(run_task, task, payload, self.timeout)
+        except Exception:
+            self.slots.release()
+            logger.exception("Could not start media processing task %s", task)
+            return self.fail({"statusCode": 500}, wait, callback)
+
+        future.add_done_callback(lambda f: self.task_done(f, callback))
+
+        if wait:
+            try:
+                # Task is stopped after timeout in worker, extra time is for starting worker
+                return future.result(timeout=self.timeout + 30)
+            except Exception:
+                return {"statusCode": 500}
+
+    def fail(self, response: dict, wait: bool, callback):
+        """ Respond to task that couldn't be started the same way as a task that failed """
+        if callback:
+            callback_executor.submit(run_callback, callback, response)
+
+        if wait:
+            return response
+
+    def task_done(self, future, callback):
+        self.slots.release()
+
+        if future.exception():
+            logger.error("Media processing task failed", exc_info=future.exception())
+
+        if callback:
+            # Not called in this thread since callbacks can send more tasks and wait for space in queue
+            callback_executor.submit(run_callback, callback, {"statusCode": 500} if future.exception() else future.result())
+
+
+# Threads that callbacks of local backend run in
+callback_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="media-callback")
+
+
+def run_callback(callback, response: dict):
+    try:
+        callback(response)
+    except Exception:
+        logger.exception("Media processing callback failed")
+    finally:
+        # Callbacks query database from threads that requests don't clean up after
+        close_old_connections()
+
+
+def setup_worker():
+    import django
+    django.setup()
+
+
+def timeout_handler(signum, frame):
+    raise TimeoutError("Media processing task timed out")
+
+
+def run_task(task: str, payload: dict, timeout: int) -> dict:
+    """ Run task in worker process """
+    signal.signal(signal.SIGALRM, timeout_handler)
+    signal.alarm(timeout)
+    try:
+        return TASKS[task](**payload) or {"statusCode": 200}
+    finally:
+        signal.alarm(0)
+
+
+""" Tasks """
+
+
+MEME_LARGE_SIZE = (960, 960)
+MEME_VIDEO_SIZE = 720
+MEME_THUMBNAIL_SIZE = (400, 400)
+PROFILE_IMAGE_SIZE = (400, 400)
+PROFILE_SMALL_IMAGE_SIZE = (100, 100)
+MAX_VIDEO_DURATION = 60
+
+
+def download(key: str, directory: str) -> str:
+    """ Copy file from storage to local directory, returns local path """
+    path = os.path.join(directory, f"input{os.path.splitext(key)[1].lower()}")
+    with default_storage.open(key) as src, open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    return path
+
+
+def upload(path: str, key: str):
+    """ Save local file to storage at key (replacing file at key if there is one) """
+    if default_storage.exists(key):
+        default_storage.delete(key)
+
+    with open(path, "rb") as f:
+        default_storage.save(key, File(f))
+
+
+def save_image(img, key: str, directory: str, size: tuple, crop: bool = False):
+    """ Resize image to fit in size (or crop to size) and save to storage, format is from extension of key """
+    img = ImageOps.fit(img, size) if crop else img.copy()
+    if not crop:
+        img.thumbnail(size)
+
+    ext = os.path.splitext(key)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        img = img.convert("RGB")
+    elif img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+
+    path = os.path.join(directory, f"output{ext}")
+    img.save(path, quality=80)
+    upload(path, key)
+
+
+# Fit in square (H.264 needs even dimensions)
+VIDEO_SCALE_FILTER = (
+    f"scale=w='min({MEME_VIDEO_SIZE},iw)':h='min({MEME_VIDEO_SIZE},ih)'"
+    ":force_original_aspect_ratio=decrease:force_divisible_by=2"
+)
+
+
+def run_ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], check=True, timeout=settings.MEDIA_PROCESSING_TIMEOUT)
+
+
+def resize_image_meme(get_file_at: str, large_key: str, thumbnail_key: str):
+    with tempfile.TemporaryDirectory() as tmp, Image.open(download(get_file_at, tmp)) as img:
+        img = ImageOps.exif_transpose(img)
+        save_image(img, large_key, tmp, MEME_LARGE_SIZE)
+        save_image(img, thumbnail_key, tmp, MEME_THUMBNAIL_SIZE)
+
+
+def resize_gif_meme(get_file_at: str, large_key: str, thumbnail_key: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = download(get_file_at, tmp)
+        output = os.path.join(tmp, "output.mp4")
+        run_ffmpeg("-i", path, "-movflags", "faststart", "-pix_fmt", "yuv420p", "-vf", VIDEO_SCALE_FILTER, output)
+        upload(output, large_key)
+
+        with Image.open(path) as img:
+            save_image(img, thumbnail_key, tmp, MEME_THUMBNAIL_SIZE)
+
+
+def check_video_meme(get_file_at: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+                "stream=width,height:format=duration", "-of", "json", download(get_file_at, tmp)
+            ],
+            capture_output=True, timeout=settings.MEDIA_PROCESSING_TIMEOUT
+        )
+
+    info = json.loads(result.stdout or "{}")
+    if result.returncode or not info.get("streams"):
+        return {"statusCode": 418, "errorMessage": "Could not read video file"}
+
+    width, height = info["streams"][0]["width"], info["streams"][0]["height"]
+    if not 1 / 1.8 < width / height < 1.8:
+        return {"statusCode": 418, "errorMessage": "Aspect ratio must be between 16:9 and 9:16"}
+    if width < 250 or height < 250:
+        return {"statusCode": 418, "errorMessage": "Video must be at least 250x250 pixels"}
+    if float(info["format"].get("duration", 0)) > MAX_VIDEO_DURATION:
+        return {"statusCode": 418, "errorMessage": f"Video must be {MAX_VIDEO_DURATION} seconds or less"}
+
+    return {"statusCode": 200}
+
+
+def resize_video_meme(get_file_at: str, thumbnail_key: str):
+    """ Convert video to MP4 (at same key with .mp4 extension, see Meme.resize_video) and save thumbnail """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = download(get_file_at, tmp)
+        output = os.path.join(tmp, "output.mp4")
+        run_ffmpeg(
+            "-i", path, "-movflags", "faststart", "-pix_fmt", "yuv420p", "-c:v", "libx264", "-c:a", "aac",
+            "-vf", VIDEO_SCALE_FILTER, output
+        )
+        upload(output, f"{os.path.splitext(get_file_at)[0]}.mp4")
+        if os.path.splitext(get_file_at)[1].lower() != ".mp4":
+            default_storage.delete(get_file_at)
+
+        frame = os.path.join(tmp, "frame.png")
+        run_ffmpeg("-i", output, "-frames:v", "1", frame)
+        with Image.open(frame) as img:
+            save_image(img, thumbnail_key, tmp, MEME_THUMBNAIL_SIZE)
+
+
+def resize_profile_image(image_key: str, small_image_key: str):
+    with tempfile.TemporaryDirectory() as tmp, Image.open(download(image_key, tmp)) as img:
+        img = ImageOps.exif_transpose(img)
+        save_image(img, small_image_key, tmp, PROFILE_SMALL_IMAGE_SIZE, crop=True)
+        save_image(img, image_key, tmp, PROFILE_IMAGE_SIZE, crop=True)
+
+
+def resize_any_image(file_key: str, dimensions: tuple):
+    """ Resize and crop image to dimensions, replacing original """
+    with tempfile.TemporaryDirectory() as tmp, Image.open(download(file_key, tmp)) as img:
+        save_image(ImageOps.exif_transpose(img), file_key, tmp, tuple(dimensions), crop=True)
+
+
+TASKS = {
+    "resize_image_meme": resize_image_meme,
+    "resize_gif_meme": resize_gif_meme,
+    "check_video_meme": check_video_meme,
+    "resize_video_meme": resize_video_meme,
+    "resize_profile_image": resize_profile_image,
+    "resize_any_image": resize_any_image,
+}
+
+
+media_backend = import_string(settings.MEDIA_PROCESSING_BACKEND)()
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meme',
+            index=models.Index(fields=['-upload_date', '-id'], name='memes_meme_upload__9e3e59_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Fill feeds with memes from the past week so that home feeds aren't empty after migrating
+BACKFILL_FEEDS = """
+INSERT INTO memes_feeditem (user_id, meme_id, upload_date)
+SELECT f.follower_id, m.id, m.upload_date
+FROM memes_following f JOIN memes_meme m ON m.user_id = f.following_id
+WHERE NOT m.private AND NOT m.page_private AND NOT m.hidden AND m.upload_date > now() - interval '7 days'
+UNION
+SELECT s.subscriber_id, m.id, m.upload_date
+FROM memes_subscriber s JOIN memes_meme m ON m.page_id = s.page_id
+WHERE NOT m.private AND NOT m.hidden AND m.upload_date > now() - interval '7 days'
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0002_meme_upload_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_date', models.DateTimeField()),
+                ('meme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='memes.meme')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-upload_date', '-meme'], name='memes_feedi_user_id_cae3c2_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'meme'), name='unique_feed_item'),
+        ),
+        migrations.RunSQL(BACKFILL_FEEDS, migrations.RunSQL.noop),
+    ]
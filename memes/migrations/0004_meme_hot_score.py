@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0003_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meme',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='meme',
+            index=models.Index(fields=['-hot_score', '-id'], name='memes_meme_hot_sco_562fda_idx'),
+        ),
+    ]
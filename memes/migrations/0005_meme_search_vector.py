@@ -0,0 +1,36 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:14
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_TRIGGER = """
+CREATE TRIGGER memes_meme_search_vector_update
+BEFORE INSERT OR UPDATE OF caption ON memes_meme
+FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.simple', caption);
+
+UPDATE memes_meme SET search_vector = to_tsvector('pg_catalog.simple', caption);
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS memes_meme_search_vector_update ON memes_meme;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0004_meme_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meme',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='meme',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='memes_meme_search__aeea77_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
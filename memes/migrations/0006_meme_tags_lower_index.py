@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:14
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0005_meme_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meme',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags_lower'], name='memes_meme_tags_lo_d39f53_gin'),
+        ),
+    ]
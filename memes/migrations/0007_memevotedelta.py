@@ -0,0 +1,25 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0006_meme_tags_lower_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemeVoteDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.SmallIntegerField()),
+                ('num_likes', models.SmallIntegerField()),
+                ('num_dislikes', models.SmallIntegerField()),
+                ('like', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='memes.memelike')),
+                ('meme', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='memes.meme')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0007_memevotedelta'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='meme',
+            name='memes_meme_upload__9e3e59_idx',
+        ),
+        # Existing memes were already resized
+        migrations.AddField(
+            model_name='meme',
+            name='processing_state',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Ready'), (2, 'Failed')], default=1),
+        ),
+        migrations.AlterField(
+            model_name='meme',
+            name='processing_state',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Ready'), (2, 'Failed')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='meme',
+            index=models.Index(condition=models.Q(processing_state=1), fields=['-upload_date', '-id'], name='meme_ready_upload_date_idx'),
+        ),
+    ]
@@ -1,2 +1,4 @@
-from .core import User, Following, Profile, Meme, Category, Comment, MemeLike, CommentLike
+from .core import User, Following, Profile, Meme, PendingUpload, Category, Comment, MemeLike, CommentLike
 from .page import Page, Moderator, Subscriber, SubscribeRequest, InviteLink, ModeratorInvite
+from .feed import FeedItem
+from .counters import MemeVoteDelta, set_meme_vote
@@ -3,19 +3,19 @@ from django.db.models import Q, CheckConstraint, UniqueConstraint
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
-from django.core.exceptions import ValidationError
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 
 from memes.utils import resize_any_image
+from memes.media import media_backend
 
 from secrets import token_urlsafe
-import os, boto3, json
-
-
-client = boto3.client('lambda', region_name=settings.AWS_S3_REGION_NAME)
+import os
 
 
 def set_uuid():
@@ -56,15 +56,10 @@ class User(AbstractUser):
         self.save(update_fields=("image", "small_image"))
 
         # Resize new images
-        client.invoke(
-            FunctionName="resize_profile_image",
-            InvocationType="Event",
-            Payload=json.dumps({
-                "image_key": self.image.name,
-                "small_image_key": self.small_image.name,
-            }),
-            Qualifier="$LATEST"
-        )
+        media_backend.process("resize_profile_image", {
+            "image_key": self.image.name,
+            "small_image_key": self.small_image.name,
+        })
 
         # Update all memes and comments
         self.memes.update(user_image=self.small_image.name)
@@ -130,6 +125,12 @@ def empty_json():
 
 
 class Meme(models.Model):
+
+    class ProcessingState(models.IntegerChoices):
+        PENDING = 0, _("Pending")
+        READY = 1, _("Ready")
+        FAILED = 2, _("Failed")
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="memes")
     username = models.CharField(max_length=32, blank=False)
     user_image = models.ImageField(null=True, blank=True)
@@ -150,6 +151,8 @@ class Meme(models.Model):
     uuid = models.CharField(max_length=11, default=set_uuid, unique=True)
     dank = models.BooleanField(default=False)
     caption = models.CharField(max_length=100, blank=True)
+    # Kept up to date with caption by database trigger (see migration 0005)
+    search_vector = SearchVectorField(null=True, editable=False)
     upload_date = models.DateTimeField(auto_now_add=True)
     num_likes = models.PositiveIntegerField(default=0)
     num_dislikes = models.PositiveIntegerField(default=0)
@@ -160,6 +163,10 @@ class Meme(models.Model):
     tags = ArrayField(models.CharField(max_length=64, blank=False), default=empty_list)
     tags_lower = ArrayField(models.CharField(max_length=64, blank=False), default=empty_list)
     num_views = models.PositiveIntegerField(default=0)
+    # Time-decayed points, updated periodically by "python manage.py update_hot_scores"
+    hot_score = models.FloatField(default=0)
+    # Memes are only shown in feeds when ready (resized files exist), see processing_done and check_processing command
+    processing_state = models.PositiveSmallIntegerField(default=ProcessingState.PENDING, choices=ProcessingState.choices)
 
     report_labels = models.JSONField(default=empty_json)
     reviewed = models.BooleanField(default=False)
@@ -170,7 +177,18 @@ class Meme(models.Model):
 
     class Meta:
         ordering = ["-id"]
-        indexes = [models.Index(fields=["user", "upload_date"])]
+        indexes = [
+            models.Index(fields=["user", "upload_date"]),
+            # Used in pagination.KeysetPagination
+            models.Index(fields=["-upload_date", "-id"], name="meme_ready_upload_date_idx", condition=Q(processing_state=1)),
+            models.Index(fields=["-hot_score", "-id"]),    # Used in api_views.MemeViewSet (sort=hot)
+            GinIndex(fields=["search_vector"]),    # Used in api_views.MemeViewSet (search by caption)
+            GinIndex(fields=["tags_lower"]),    # Used in api_views.MemeViewSet (search by tags) and TagMemeViewSet
+        ]
+        constraints = [
+            # Memes can't share a file since deleting one would delete the other's file
+            UniqueConstraint(fields=["original"], name="unique_meme_original"),
+        ]
 
     def __str__(self):
         return f"{self.id}"
@@ -202,60 +220,81 @@ class Meme(models.Model):
         # Assign new name for thumbnail
         self.thumbnail.name = f"users/{self.username}/thumbnail/{set_random_filename('a.webp')}"
 
-        # Invoke async function to resize GIF or image
-        client.invoke(
-            FunctionName="resize_gif_meme" if is_gif else "resize_image_meme",
-            InvocationType="Event",
-            Payload=json.dumps({
-                "get_file_at": self.original.name,
-                "large_key": self.large.name,
-                "thumbnail_key": self.thumbnail.name,
-            })
-        )
-
-        # Save fields after invoking function to buy some time
+        # Save before starting task since callback can run straight away
         self.save(update_fields=("large", "thumbnail"))
 
-    def resize_video(self):
-        response = client.invoke(
-            FunctionName="check_video_meme",
-            InvocationType="RequestResponse",
-            Payload=json.dumps({
-                "get_file_at": self.original.name,
-            }),
-            Qualifier="$LATEST"
-        )
-
-        response = json.loads(response["Payload"].read())
-
-        if response.get("statusCode") == 200:
-            # Assign new thumbnail name
-            self.thumbnail.name = f"users/{self.username}/thumbnail/{set_random_filename('a.webp')}"
-
-            # Invoke async function to resize video
-            client.invoke(
-                FunctionName="resize_video_meme",
-                InvocationType="Event",
-                Payload=json.dumps({
-                    "get_file_at": self.original.name,
-                    "thumbnail_key": self.thumbnail.name,
-                }),
-                Qualifier="$LATEST"
-            )
-
-            is_mov = self.get_original_ext() == ".mov"
-            if is_mov:
-                self.original.name = f"{os.path.splitext(self.original.name)[0]}.mp4"
-
-            # Save new thumbnail (and original) name
-            self.save(update_fields=("original", "thumbnail") if is_mov else ["thumbnail"])
+        # Start async task to resize GIF or image
+        media_backend.process("resize_gif_meme" if is_gif else "resize_image_meme", {
+            "get_file_at": self.original.name,
+            "large_key": self.large.name,
+            "thumbnail_key": self.thumbnail.name,
+        }, callback=self.processing_done)
 
+    def resize_video(self):
+        """ Check video then resize it without waiting, meme is deleted if video is invalid (see video_checked) """
+        # Assign new thumbnail name
+        self.thumbnail.name = f"users/{self.username}/thumbnail/{set_random_filename('a.webp')}"
+        # Save before starting task since callback can run straight away
+        self.save(update_fields=["thumbnail"])
+
+        # Start async task to check video
+        media_backend.process("check_video_meme", {"get_file_at": self.original.name}, callback=self.video_checked)
+
+    def video_checked(self, response):
+        if response.get("statusCode") != 200:
+            self.processing_done(response)
+            return
+
+        # Start async task to resize video (original is renamed when it finishes, see get_processed_original_name)
+        media_backend.process("resize_video_meme", {
+            "get_file_at": self.original.name,
+            "thumbnail_key": self.thumbnail.name,
+        }, callback=self.processing_done)
+
+    def get_processed_original_name(self):
+        """ Resized video replaces original at same key with .mp4 extension """
+        if self.get_original_ext() == ".mov":
+            return f"{os.path.splitext(self.original.name)[0]}.mp4"
+
+        return self.original.name
+
+    def processing_done(self, response):
+        """ Set processing state when checking or resizing finishes, meme is deleted if it failed """
+        from memes.cache import invalidate_scopes
+
+        ready = response.get("statusCode") == 200
+        if ready:
+            self.original.name = self.get_processed_original_name()
+            fields = {"processing_state": Meme.ProcessingState.READY, "original": self.original.name}
         else:
-            self.delete()
-            if response.get("statusCode") == 418:
-                raise ValidationError(response.get("errorMessage"))
-
-            raise InternalError()
+            fields = {"processing_state": Meme.ProcessingState.FAILED}
+        updated = Meme.all_objects.filter(id=self.id, processing_state=Meme.ProcessingState.PENDING).update(**fields)
+
+        if ready:
+            # Single meme responses cached while pending have the old original and processing state
+            scopes = ["memes", f"meme:{self.uuid}"]
+            if self.page_name:
+                scopes.append(f"page:{self.page_name}")
+            invalidate_scopes(*scopes)
+        elif updated:
+            # Only invalid files (418) and full queue (503) have messages meant for users
+            self.processing_failed(response.get("errorMessage") if response.get("statusCode") in (418, 503) else None)
+
+    def processing_failed(self, message: str = None):
+        """ Delete meme (signals take back its counters) and keep reason for views.upload_status """
+        from memes.cache import cache_upload_failure
+
+        cache_upload_failure(self.uuid, self.user_id, message or "Could not process file")
+
+        # Get meme again since fields like points can change while processing
+        meme = Meme.all_objects.filter(id=self.id).first()
+        if meme is not None:
+            meme.delete()
+
+            # Resizing may have replaced original before failing
+            processed = meme.get_processed_original_name()
+            if processed != meme.original.name and default_storage.exists(processed):
+                default_storage.delete(processed)
 
     def resize_file(self):
         if self.get_original_ext() in (".jpg", ".png", ".jpeg", ".gif"):
@@ -273,6 +312,25 @@ def delete_meme_files(sender, instance, **kwargs):
     instance.thumbnail.delete(False)
 
 
+class PendingUpload(models.Model):
+    """
+    Meme file being uploaded straight to storage (see views.upload_init), deleted when meme is created from it
+
+    Files of uploads that are never completed are deleted by "python manage.py check_processing"
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=100, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key}"
+
+    @classmethod
+    def claim(cls, user_id, key) -> bool:
+        """ Delete pending upload, returns False if it was already completed or cleaned up """
+        return cls.objects.filter(user_id=user_id, key=key).delete()[0] > 0
+
+
 class Category(models.Model):
 
     class Name(models.TextChoices):
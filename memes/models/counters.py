@@ -0,0 +1,164 @@
+from django.db import models, transaction, connection
+from django.db.models import F
+
+from .core import Meme, MemeLike, Profile
+
+
+class MemeVoteDelta(models.Model):
+    """
+    Change to vote counters of a meme (and clout of the user who posted it)
+
+    Also inserted directly by set_meme_vote (keep both in sync)
+
+    Voting only inserts a delta, deltas are applied in batches by "python manage.py flush_vote_deltas"
+    so that popular memes get one UPDATE per flush instead of one per vote
+    """
+    # No foreign key constraint so that deltas from deleting a meme's likes don't block deleting the meme
+    meme = models.ForeignKey(Meme, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    points = models.SmallIntegerField()
+    num_likes = models.SmallIntegerField()
+    num_dislikes = models.SmallIntegerField()
+    # Like to notify user who posted meme about (only set when a like is created)
+    like = models.ForeignKey(MemeLike, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    def __str__(self):
+        return f"Meme {self.meme_id} {self.points:+} points"
+
+    @classmethod
+    def record(cls, vote, action):
+        """
+        Record change from vote being created, changed (from opposite point), or deleted
+
+        Scenarios: like created, dislike created, like changed to dislike, dislike changed to like,
+                   like deleted, dislike deleted
+        """
+        assert action in ("create", "change", "delete")
+
+        is_like = vote.point == 1
+        if action == "create":
+            delta = cls(points=vote.point, num_likes=int(is_like), num_dislikes=int(not is_like))
+        elif action == "change":
+            delta = cls(points=vote.point * 2, num_likes=vote.point, num_dislikes=-vote.point)
+        else:
+            delta = cls(points=-vote.point, num_likes=-int(is_like), num_dislikes=-int(not is_like))
+
+        delta.meme_id = vote.meme_id
+        if action == "create" and is_like:
+            delta.like_id = vote.id
+        delta.save()
+
+        return delta
+
+    @classmethod
+    def flush(cls, batch_size=1000):
+        """
+        Apply a batch of deltas in one transaction
+
+        Returns number of deltas applied and list of (meme, old points, new points, like IDs)
+        for memes that were updated
+        """
+        with transaction.atomic():
+            # Skip deltas locked by other flushers so that flushers can run concurrently
+            deltas = list(cls.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+            if not deltas:
+                return 0, []
+
+            totals = {}
+            for d in deltas:
+                t = totals.setdefault(d.meme_id, {"points": 0, "num_likes": 0, "num_dislikes": 0, "likes": []})
+                t["points"] += d.points
+                t["num_likes"] += d.num_likes
+                t["num_dislikes"] += d.num_dislikes
+                if d.like_id:
+                    t["likes"].append(d.like_id)
+
+            # Deltas for deleted memes are dropped (clout is taken back when meme is deleted)
+            # Lock memes (in ID order like the updates) so that old points are current for milestones
+            memes = Meme.all_objects.select_for_update(of=("self",)) \
+                                    .select_related("user") \
+                                    .only("user__id", "points", "uuid", "thumbnail") \
+                                    .filter(id__in=totals) \
+                                    .order_by("id")
+
+            results = []
+            clout = {}
+            for meme in memes:
+                t = totals[meme.id]
+                Meme.all_objects.filter(id=meme.id).update(
+                    points=F("points") + t["points"],
+                    num_likes=F("num_likes") + t["num_likes"],
+                    num_dislikes=F("num_dislikes") + t["num_dislikes"]
+                )
+                clout[meme.user_id] = clout.get(meme.user_id, 0) + t["points"]
+                results.append((meme, meme.points, meme.points + t["points"], t["likes"]))
+
+            # Sort to always lock profiles in the same order
+            for user_id in sorted(clout):
+                if clout[user_id]:
+                    Profile.objects.filter(user_id=user_id).update(clout=F("clout") + clout[user_id])
+
+            cls.objects.filter(id__in=[d.id for d in deltas]).delete()
+
+        return len(deltas), results
+
+
+UPSERT_MEME_VOTE = """
+WITH vote AS (
+    INSERT INTO memes_memelike (user_id, meme_id, meme_uuid, point, liked_on)
+    SELECT %(user_id)s, m.id, m.uuid, %(point)s, now()
+    FROM memes_meme m
+    WHERE m.uuid = %(uuid)s AND NOT m.hidden
+        AND (NOT m.private OR m.user_id = %(user_id)s)
+        AND (NOT m.page_private
+            OR EXISTS (SELECT 1 FROM memes_subscriber s WHERE s.page_id = m.page_id AND s.subscriber_id = %(user_id)s)
+            OR EXISTS (SELECT 1 FROM memes_moderator d WHERE d.page_id = m.page_id AND d.user_id = %(user_id)s))
+    ON CONFLICT (user_id, meme_id) DO UPDATE SET point = EXCLUDED.point, liked_on = EXCLUDED.liked_on
+    WHERE memes_memelike.point <> EXCLUDED.point
+    RETURNING id, meme_id, point, (xmax = 0) AS created
+), delta AS (
+    INSERT INTO memes_memevotedelta (meme_id, points, num_likes, num_dislikes, like_id)
+    SELECT meme_id,
+        CASE WHEN created THEN point ELSE point * 2 END,
+        CASE WHEN created THEN (point = 1)::int ELSE point END,
+        CASE WHEN created THEN (point = -1)::int ELSE -point END,
+        CASE WHEN created AND point = 1 THEN id END
+    FROM vote
+)
+SELECT CASE WHEN created THEN point ELSE point * 2 END FROM vote
+"""
+
+DELETE_MEME_VOTE = """
+WITH vote AS (
+    DELETE FROM memes_memelike WHERE user_id = %(user_id)s AND meme_uuid = %(uuid)s
+    RETURNING id, meme_id, point
+), unlink AS (
+    UPDATE memes_memevotedelta SET like_id = NULL WHERE like_id IN (SELECT id FROM vote)
+), delta AS (
+    INSERT INTO memes_memevotedelta (meme_id, points, num_likes, num_dislikes)
+    SELECT meme_id, -point, -(point = 1)::int, -(point = -1)::int FROM vote
+)
+SELECT -point FROM vote
+"""
+
+
+def set_meme_vote(user_id, uuid, point):
+    """
+    Like (1), dislike (-1), or remove vote (0) from meme in a single query, safe to retry
+
+    Same as creating, changing, or deleting a MemeLike but without reading it first,
+    returns change in points or None if user can't vote on meme
+    """
+    assert point in (1, -1, 0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_MEME_VOTE if point else DELETE_MEME_VOTE, {"user_id": user_id, "uuid": uuid, "point": point})
+        row = cursor.fetchone()
+
+    if row:
+        return row[0]
+
+    # Nothing changed if vote already existed (or didn't exist when removing vote)
+    if not point or MemeLike.objects.filter(user_id=user_id, meme_uuid=uuid, point=point).exists():
+        return 0
+
+    return None
@@ -0,0 +1,112 @@
+from django.db import models
+from django.db.models import Q, UniqueConstraint
+from django.conf import settings
+from django.utils import timezone
+
+from .core import Meme, Following, Profile
+from .page import Page, Subscriber
+
+
+class FeedItem(models.Model):
+    """
+    Meme in a user's home feed, pushed when the meme is uploaded (fan-out on write)
+
+    Memes from users/pages with more than FEED_FANOUT_LIMIT followers/subscribers are
+    not pushed, they are pulled into the feed when it is read instead (fan-out on read)
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed_items")
+    meme = models.ForeignKey(Meme, on_delete=models.CASCADE, related_name="feed_items")
+    # Copy of meme upload date so that newest feed items of a user are a range scan of one index
+    upload_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=["user", "meme"], name="unique_feed_item")]
+        indexes = [models.Index(fields=["user", "-upload_date", "-meme"])]
+
+    def __str__(self):
+        return f"Meme {self.meme_id} in {self.user_id} feed"
+
+    @classmethod
+    def add_memes(cls, user_ids, memes):
+        """ memes is a list of (id, upload_date) """
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, meme_id=meme_id, upload_date=upload_date)
+                for user_id in user_ids for meme_id, upload_date in memes],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def fan_out(cls, meme):
+        """ Push new meme to feeds of followers of user and subscribers of page """
+        if meme.private:
+            return
+
+        user_ids = set()
+        limit = settings.FEED_FANOUT_LIMIT
+
+        if meme.page_id:
+            if Page.objects.filter(id=meme.page_id, num_subscribers__lt=limit).exists():
+                user_ids.update(Subscriber.objects.filter(page_id=meme.page_id).values_list("subscriber_id", flat=True))
+
+        # Memes on private pages are only shown to subscribers
+        if not meme.page_private:
+            if Profile.objects.filter(user_id=meme.user_id, num_followers__lt=limit).exists():
+                user_ids.update(Following.objects.filter(following_id=meme.user_id).values_list("follower_id", flat=True))
+
+        cls.add_memes(user_ids, [(meme.id, meme.upload_date)])
+
+    @classmethod
+    def get_feed_filter(cls, user):
+        """
+        Filter for memes in feed of user: memes pushed to feed, and recent memes from followed users
+        and subscribed pages that were too big to fan out (merged when read, not saved to feed)
+        """
+        limit = settings.FEED_FANOUT_LIMIT
+
+        popular_users = Following.objects.filter(follower=user, following__profile__num_followers__gte=limit) \
+                                         .values("following_id")
+        popular_pages = Subscriber.objects.filter(subscriber=user, page__num_subscribers__gte=limit) \
+                                          .values("page_id")
+        recent = Q(upload_date__gt=timezone.now()-settings.FEED_PULL_WINDOW)
+
+        return (Q(id__in=cls.objects.filter(user=user).values("meme_id"))
+                | recent & Q(user__in=popular_users, page_private=False)
+                | recent & Q(page__in=popular_pages))
+
+    @classmethod
+    def follow(cls, user_id, followed_id):
+        """ Add recent memes from newly followed user """
+        memes = Meme.objects.filter(user_id=followed_id, private=False, page_private=False) \
+                            .values_list("id", "upload_date")[:settings.FEED_BACKFILL_SIZE]
+
+        cls.add_memes([user_id], memes)
+
+    @classmethod
+    def unfollow(cls, user_id, followed_id):
+        """ Remove memes from unfollowed user unless they were posted on a subscribed page """
+        cls.objects.filter(user_id=user_id, meme__user_id=followed_id) \
+                   .exclude(meme__page__subscribers=user_id) \
+                   .delete()
+
+    @classmethod
+    def subscribe(cls, user_id, page_id):
+        """ Add recent memes from newly subscribed page """
+        memes = Meme.objects.filter(page_id=page_id, private=False) \
+                            .values_list("id", "upload_date")[:settings.FEED_BACKFILL_SIZE]
+
+        cls.add_memes([user_id], memes)
+
+    @classmethod
+    def unsubscribe(cls, user_id, page_id):
+        """ Remove memes from page unless they were posted by a followed user on a public page """
+        cls.objects.filter(user_id=user_id, meme__page_id=page_id) \
+                   .exclude(meme__user__followers=user_id, meme__page_private=False) \
+                   .delete()
+
+    @classmethod
+    def page_made_private(cls, page_id):
+        """ Remove memes on page that became private from feeds of users who aren't subscribed """
+        cls.objects.filter(meme__page_id=page_id) \
+                   .exclude(user__subscriptions=page_id) \
+                   .delete()
@@ -0,0 +1,140 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+import json
+from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Paginate using the ordering fields of the last object sent instead of an offset
+
+    The cursor is opaque to clients and only ever used to filter WHERE (a, b) < (x, y),
+    so every page costs the same as the first and new objects don't cause duplicates
+    """
+    page_size = 20
+    cursor_query_param = "cursor"
+    # All fields must be descending, last field must be unique
+    ordering = ("-upload_date", "-id")
+
+    def get_ordering(self, view):
+        """ Let views change the ordering (e.g. for sorting by points) """
+        if hasattr(view, "get_cursor_ordering"):
+            return view.get_cursor_ordering()
+
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(view)
+        assert all(f.startswith("-") for f in ordering)
+        self.fields = [f[1:] for f in ordering]
+
+        queryset = queryset.order_by(*ordering)
+
+        cursor = self.decode_cursor(queryset.model)
+        if cursor:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+
+        # Get one extra object to check if there is a next page instead of running COUNT(*)
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_cursor_filter(self, values):
+        """ Expand (a, b, c) < (x, y, z) into a filter """
+        q = Q()
+        for i, field in enumerate(self.fields):
+            equal = {f: v for f, v in zip(self.fields[:i], values[:i])}
+            q |= Q(**equal, **{f"{field}__lt": values[i]})
+
+        # Redundant condition on first field so that database can do an index range scan
+        return Q(**{f"{self.fields[0]}__lte": values[0]}) & q
+
+    def decode_cursor(self, model):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            assert isinstance(values, list) and len(values) == len(self.fields)
+            return [self.to_python(model, f, v) for f, v in zip(self.fields, values)]
+        except Exception:
+            raise NotFound("Invalid cursor")
+
+    def to_python(self, model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # Annotated fields are either numbers or datetimes
+            return parse_datetime(value) if isinstance(value, str) else value
+
+    def encode_cursor(self, obj):
+        # Keep microseconds (DjangoJSONEncoder rounds to milliseconds, which would skip objects in between)
+        values = [v.isoformat() if isinstance(v, datetime) else v for v in (getattr(obj, f) for f in self.fields)]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data
+        })
+
+
+class NotificationPagination(KeysetPagination):
+    ordering = ("-timestamp", "-id")
+
+
+class CountlessPagination(pagination.PageNumberPagination):
+    """
+    Same as PageNumberPagination but without running COUNT(*) over the whole queryset,
+    get one extra object instead to check if there is a next page
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+            assert self.page_number > 0
+        except (ValueError, AssertionError):
+            raise NotFound("Invalid page")
+
+        offset = (self.page_number - 1) * self.page_size
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+
+        return results[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data
+        })
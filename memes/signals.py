@@ -1,9 +1,9 @@
 from django.db.models.signals import post_save, m2m_changed, pre_delete
 from django.dispatch import receiver
-from .models import Meme, MemeLike, CommentLike, Comment, User, Page, Profile
+from .models import Meme, MemeLike, CommentLike, Comment, User, Page, Profile, FeedItem, MemeVoteDelta
+from .cache import invalidate_scopes, cache_vote
 from notifications.models import Notification
 from notifications.signals import (
-    meme_voted_signal,
     comment_voted_signal,
     comment_posted_signal,
     follow_user_signal,
@@ -26,68 +26,39 @@ def upload_meme(sender, instance, created, **kwargs):
 
         if instance.page_id:
             Page.objects.filter(id=instance.page_id).update(num_posts=F("num_posts") + 1)
+            invalidate_scopes(f"page:{instance.page_name}")
 
-        # Resize after incrementing so that if it fails, database can decrement without error
+        invalidate_scopes("memes")
+
+        # Push to home feeds of followers and subscribers (feed items are deleted with meme if processing fails)
+        FeedItem.fan_out(instance)
+
+        # Start processing last since its callback can delete meme straight away,
+        # and after incrementing so that counters can be decremented without error
         instance.resize_file()
 
 
 @receiver(pre_delete, sender=Meme)
 def delete_meme(sender, instance, **kwargs):
-    Profile.objects.filter(user_id=instance.user_id).update(num_memes=F("num_memes") - 1)
+    # Take back clout from votes (votes not applied yet are dropped when deltas are flushed)
+    Profile.objects.filter(user_id=instance.user_id).update(num_memes=F("num_memes") - 1, clout=F("clout") - instance.points)
 
     if instance.page_id:
         Page.objects.filter(id=instance.page_id).update(num_posts=F("num_posts") - 1)
+        invalidate_scopes(f"page:{instance.page_name}")
+
+    invalidate_scopes("memes", f"meme:{instance.uuid}")
 
 
 @receiver(post_save, sender=MemeLike)
 def vote_meme(sender, instance, created, **kwargs):
     """
-    Update fields when new vote is created or when vote is changed
+    Record change to counters when new vote is created or when vote is changed
 
-    Scenarios: like created, dislike created, like changed to dislike, dislike changed to like
+    Counters on meme and clout are updated later in batches (see models.MemeVoteDelta)
     """
-    like_created = created and instance.point == 1
-    if like_created:
-        # Extra fields selected to use when creating notification
-        meme = Meme.objects.select_related("user") \
-                           .only("num_likes", "points", "uuid", "thumbnail", "user__id") \
-                           .get(id=instance.meme_id)
-        user_id = meme.user.id
-    else:
-        # Select both num_likes and num_dislikes even if scenario is 'dislike created' (good enough)
-        meme = Meme.objects.only("num_likes", "num_dislikes", "points", "user").get(id=instance.meme_id)
-        user_id = meme.user_id
-
-    # Calculate point change
-    change = instance.point if created else instance.point * 2
-
-    new_points = meme.points + change    # Do this so no need to call .refresh_from_db()
-    # Update points on meme
-    meme.points = F("points") + change
-    # Update num_likes and/or num_dislikes field on meme
-    if instance.point == 1:
-        # Set field to update
-        field = "num_likes"
-        # Update num_likes
-        meme.num_likes = F("num_likes") + 1
-        if not created:
-            meme.num_dislikes = F("num_dislikes") - 1
-    elif instance.point == -1:
-        # Set field to update
-        field = "num_dislikes"
-        # Update num_dislikes
-        meme.num_dislikes = F("num_dislikes") + 1
-        if not created:
-            meme.num_likes = F("num_likes") - 1
-
-    meme.save(update_fields=(field, "points") if created else ("num_likes", "num_dislikes", "points"))
-
-    # Update clout on user who posted that
-    Profile.objects.filter(user_id=user_id).update(clout=F("clout") + change)
-
-    # Notify if vote is a like and user is not liking their own meme
-    if like_created and user_id != instance.user_id:
-        meme_voted_signal.send(sender=sender, instance=instance, meme=meme, points=new_points)
+    MemeVoteDelta.record(instance, "create" if created else "change")
+    cache_vote(instance.user_id, "meme", instance.meme_uuid, instance.point)
 
 
 @receiver(post_save, sender=CommentLike)
@@ -110,6 +81,7 @@ def vote_comment(sender, instance, created, **kwargs):
     comment.points = F("points") + change
     comment.save(update_fields=["points"])
     Profile.objects.filter(user_id=user_id).update(clout=F("clout") + change)
+    cache_vote(instance.user_id, "comment", instance.comment_uuid, instance.point)
 
     # Notify if vote is a like and user is not liking their own comment
     if like_created and user_id != instance.user_id:
@@ -118,16 +90,15 @@ def vote_comment(sender, instance, created, **kwargs):
 
 @receiver(pre_delete, sender=MemeLike)
 def unvote_meme(sender, instance, **kwargs):
-    field = "num_likes" if instance.point == 1 else "num_dislikes"
-    Meme.objects.filter(uuid=instance.meme_uuid) \
-                .update(**{"points": F("points") - instance.point, field: F(field) - 1})
-    Profile.objects.filter(user_id=instance.meme.user_id).update(clout=F("clout") - instance.point)
+    MemeVoteDelta.record(instance, "delete")
+    cache_vote(instance.user_id, "meme", instance.meme_uuid, 0)
 
 
 @receiver(pre_delete, sender=CommentLike)
 def unvote_comment(sender, instance, **kwargs):
     Comment.objects.filter(uuid=instance.comment_uuid).update(points=F("points") - instance.point)
     Profile.objects.filter(user_id=instance.comment.user_id).update(clout=F("clout") - instance.point)
+    cache_vote(instance.user_id, "comment", instance.comment_uuid, 0)
 
 
 @receiver(post_save, sender=Comment)
@@ -138,6 +109,7 @@ def comment_meme(sender, instance, created, **kwargs):
 
         # Update number of comments
         Meme.objects.filter(id=instance.meme_id).update(num_comments=F("num_comments") + 1)
+        invalidate_scopes(f"meme:{instance.meme_uuid}")
 
         comment_posted_signal.send(sender=sender, instance=instance)
 
@@ -150,6 +122,12 @@ def follow_user(sender, instance, action, **kwargs):
 
         for pk in kwargs["pk_set"]:
             Profile.objects.filter(user_id=pk).update(num_followers=F("num_followers") + change)
+
+            if action == "post_add":
+                FeedItem.follow(instance.id, pk)
+            else:
+                FeedItem.unfollow(instance.id, pk)
+
             follow_user_signal.send(sender=sender, instance=instance, action=action, pk=pk)
             break
 
@@ -159,8 +137,14 @@ def subscribe_page(sender, instance, action, **kwargs):
     if action in ("post_add", "post_remove"):
         change = 1 if action == "post_add" else -1
         Page.objects.filter(id=instance.id).update(num_subscribers=F("num_subscribers") + change)
+        invalidate_scopes(f"page:{instance.name}")
 
         for pk in kwargs["pk_set"]:
+            if action == "post_add":
+                FeedItem.subscribe(pk, instance.id)
+            else:
+                FeedItem.unsubscribe(pk, instance.id)
+
             subscribe_page_signal.send(sender=sender, instance=instance, action=action, pk=pk)
             break
 
@@ -170,3 +154,15 @@ def add_page_mod(sender, instance, action, **kwargs):
     if action in ("post_add", "post_remove"):
         change = 1 if action == "post_add" else -1
         Page.objects.filter(id=instance.id).update(num_mods=F("num_mods") + change)
+        invalidate_scopes(f"page:{instance.name}")
+
+
+@receiver(post_save, sender=Page)
+def update_page(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_scopes(f"page:{instance.name}")
+
+
+@receiver(pre_delete, sender=Page)
+def delete_page(sender, instance, **kwargs):
+    invalidate_scopes(f"page:{instance.name}")
@@ -1,3 +1,82 @@
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from .models import Meme, User
+from .pagination import KeysetPagination
+from .api_views import MemePagination
+
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+
+class KeysetPaginationTests(TestCase):
+    pagination_class = KeysetPagination
+
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+
+    def create_memes(self, timestamps):
+        # bulk_create so that post_save doesn't start processing
+        Meme.objects.bulk_create([
+            Meme(user=self.user, username=self.user.username, original=f"users/user/original/{i}.jpg")
+            for i in range(len(timestamps))
+        ])
+        # Set timestamps after creating since auto_now_add overrides them
+        for meme, timestamp in zip(Meme.objects.order_by("id"), timestamps):
+            Meme.objects.filter(id=meme.id).update(upload_date=timestamp)
+
+    def get_page(self, params):
+        paginator = self.pagination_class()
+        request = Request(APIRequestFactory().get("/memes", params))
+        return paginator, paginator.paginate_queryset(Meme.objects.all(), request)
+
+    def get_all_pages(self):
+        """ Follow next links until the last page, returns IDs in order """
+        ids, params = [], {}
+        while True:
+            paginator, page = self.get_page(params)
+            ids += [meme.id for meme in page]
+
+            next_link = paginator.get_next_link()
+            if next_link is None:
+                return ids
+            params = {"cursor": parse_qs(urlparse(next_link).query)["cursor"][0]}
+
+    def expected_ids(self):
+        return list(Meme.objects.order_by("-upload_date", "-id").values_list("id", flat=True))
+
+    def test_page_boundary_in_same_timestamp(self):
+        now = timezone.now().replace(microsecond=123456)
+        self.create_memes([now] * 25 + [now - timedelta(seconds=1)] * 5)
+
+        self.assertEqual(self.get_all_pages(), self.expected_ids())
+
+    def test_page_boundary_in_same_millisecond(self):
+        now = timezone.now().replace(microsecond=123000)
+        self.create_memes([now + timedelta(microseconds=i) for i in range(45)])
+
+        self.assertEqual(self.get_all_pages(), self.expected_ids())
+
+    def test_invalid_cursor(self):
+        self.create_memes([timezone.now()])
+
+        for cursor in ("abc", "WzFd", "WyJub3QgYSBkYXRlIiwgMV0="):
+            with self.assertRaises(NotFound):
+                self.get_page({"cursor": cursor})
+
+
+class MemePaginationTests(KeysetPaginationTests):
+    pagination_class = MemePagination
+
+    def test_same_upload_date_tie_break(self):
+        # Memes uploaded in the same transaction get the same upload_date, so only id tells them apart
+        now = timezone.now()
+        self.create_memes([now] * (MemePagination.page_size * 2 + 1))
+
+        paginator, page = self.get_page({})
+        self.assertEqual([meme.id for meme in page], self.expected_ids()[:MemePagination.page_size])
+        self.assertEqual(self.get_all_pages(), self.expected_ids())
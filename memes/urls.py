@@ -2,7 +2,7 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from . import views
+from . import views, api_views
 from .api import api_auth, api_profile, api_page, api_moderators, api_settings
 
 urlpatterns = [
@@ -13,11 +13,16 @@ urlpatterns = [
 
     path("m/<str:uuid>", views.meme_view, name="meme_view"),
     path("download/<str:obj>/<str:uuid>", views.download_view, name="download_view"),
+    path("tags/<str:tag>", api_views.TagMemeViewSet.as_view({"get": "list"}), name="tag_memes"),
 
     path("like", views.like, name="like"),
+    path("vote", views.vote, name="vote"),
     path("comment/<str:action>", views.comment, name="comment"),
     path("reply", views.reply, name="reply"),
     path("upload", views.upload, name="upload"),
+    path("upload/init", views.upload_init, name="upload_init"),
+    path("upload/complete", views.upload_complete, name="upload_complete"),
+    path("upload/status/<str:uuid>", views.upload_status, name="upload_status"),
 
     # Profile
     path("profile", api_profile.profile),
@@ -1,6 +1,9 @@
 from django.conf import settings
+from django.core.files.storage import default_storage
 
-import os, boto3, json
+from .media import media_backend
+
+import os
 from PIL import Image, ImageSequence
 
 
@@ -9,24 +12,28 @@ def check_file_ext(filename: str, valid_extensions: tuple) -> bool:
     return os.path.splitext(filename)[1].lower() in valid_extensions
 
 
-client = boto3.client('lambda', region_name=settings.AWS_S3_REGION_NAME)
+def get_presigned_upload(key: str, content_type: str, size: int) -> dict:
+    """ Get URL and form fields for uploading a file of at most size bytes straight to storage bucket """
+    # Use client of storage so that AWS_S3_ENDPOINT_URL (e.g. local S3-compatible server) is used too
+    return default_storage.connection.meta.client.generate_presigned_post(
+        Bucket=default_storage.bucket_name,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, size]],
+        ExpiresIn=settings.UPLOAD_URL_MAX_AGE
+    )
 
 
 def resize_any_image(file_key: str, dimensions: tuple):
-    """ Invoke lambda function to resize image and overwrite original image """
+    """ Start async task to resize image and overwrite original image """
 
     assert len(dimensions) == 2
     assert isinstance(dimensions[0], int) and isinstance(dimensions[1], int)
 
-    client.invoke(
-        FunctionName="resize_any_image",
-        InvocationType="Event",
-        Payload=json.dumps({
-            "file_key": file_key,
-            "dimensions": dimensions,
-        }),
-        Qualifier="$LATEST"
-    )
+    media_backend.process("resize_any_image", {
+        "file_key": file_key,
+        "dimensions": dimensions,
+    })
 
 
 def check_upload_file_metadata(name: str, size: int, content_type: str) -> dict:
@@ -92,6 +99,11 @@ def check_gif_info(img: object) -> dict:
     return {"success": True}
 
 
+def get_hot_score(points: int, age: float) -> float:
+    """ Get points decayed by age of meme in hours """
+    return points / (age + 2) ** settings.HOT_SCORE_GRAVITY
+
+
 def get_upload_tags(tags: list) -> list:
     """ Remove duplicate tags (case-insensitive) """
     result = []
@@ -1,13 +1,18 @@
 from django.http import HttpResponse, Http404, JsonResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.db.models import F, Q, Count
-# from django.views.decorators.cache import cache_page
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from django.conf import settings
 
-from .models import Page, Meme, Comment, MemeLike, CommentLike, Category, User, Profile
-from .utils import check_file_ext, check_upload_file_metadata, check_upload_image_file, get_upload_tags
+from .models import Page, Meme, PendingUpload, Comment, CommentLike, Category, User, Profile, set_meme_vote
+from .models.core import original_meme_path
+from .cache import get_response_cache_key, get_user_votes, cache_vote, get_upload_failure
+from .utils import check_file_ext, check_upload_file_metadata, check_upload_image_file, get_upload_tags, get_presigned_upload
 from analytics.signals import meme_viewed_signal
+from analytics.utils import get_viewer_id, get_unique_viewers
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -26,6 +31,13 @@ import boto3
 def meme_view(request, uuid):
     """ Page for individual meme with comments """
 
+    cache_key = get_response_cache_key(request, f"meme:{uuid}")
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            meme_viewed_signal.send(sender=Meme, user=request.user, meme=Meme(id=cached["id"]), viewer=get_viewer_id(request))
+            return Response(cached["response"])
+
     meme = get_object_or_404(
         Meme.objects.only(
             "private",
@@ -67,7 +79,8 @@ def meme_view(request, uuid):
         "url": meme.get_file_url(),
         "points": meme.points,
         "num_comments": meme.num_comments,
-        "tags": meme.tags
+        "tags": meme.tags,
+        "unique_viewers": get_unique_viewers(meme)
     }
 
     if page:
@@ -104,12 +117,14 @@ def meme_view(request, uuid):
 
     # Add user vote (like/dislike) if exists
     if request.user.is_authenticated:
-        try:
-            response["vote"] = MemeLike.objects.values_list("point", flat=True).get(user=request.user, meme_uuid=meme.uuid)
-        except MemeLike.DoesNotExist:
-            pass
+        vote = get_user_votes(request.user.id, "meme", [meme.uuid])[meme.uuid]
+        if vote:
+            response["vote"] = vote
 
-    meme_viewed_signal.send(sender=meme.__class__, user=request.user, meme=meme)
+    meme_viewed_signal.send(sender=meme.__class__, user=request.user, meme=meme, viewer=get_viewer_id(request))
+
+    if cache_key:
+        cache.set(cache_key, {"id": meme.id, "response": response}, settings.RESPONSE_CACHE_TIMEOUT)
 
     return Response(response)
 
@@ -152,35 +167,24 @@ def like(request):
     point = 1 if vote == "l" else -1
 
     if type_ == "m":
-        ObjectLike = MemeLike
-        uuid_field = {"meme_uuid": uuid}
-    else:
-        ObjectLike = CommentLike
-        uuid_field = {"comment_uuid": uuid}
+        # Create, change, or delete vote without reading it first (same as PUT /api/vote)
+        change = set_meme_vote(request.user.id, uuid, 0 if request.method == "DELETE" else point)
+        if change is None:
+            return HttpResponseBadRequest()
+
+        cache_vote(request.user.id, "meme", uuid, 0 if request.method == "DELETE" else point)
+
+        return HttpResponse(status={"POST": 201, "PUT": 200, "DELETE": 204}[request.method])
 
     if request.method == "POST":
         # Create a like/dislike
-        if type_ == "m":
-            meme = get_object_or_404(Meme.objects.only("user", "private", "page", "page_private"), uuid=uuid)
-            # Prevent liking other users' private memes
-            if meme.private and meme.user_id != request.user.id:
-                return HttpResponseBadRequest()
-            # Prevent liking memes posted on private pages if not subscriber or moderator
-            if meme.page_private:
-                if not (request.user.subscriptions.filter(id=meme.page_id).exists() or
-                            request.user.moderating.filter(id=meme.page_id).exists()):
-                    return HttpResponseBadRequest()
-            object_field = {"meme": meme}
-        else:
-            comment = get_object_or_404(Comment.objects.only("id"), uuid=uuid)
-            object_field = {"comment": comment}
-
-        ObjectLike.objects.create(user=request.user, **object_field, **uuid_field, point=point)
+        comment = get_object_or_404(Comment.objects.only("id"), uuid=uuid)
+        CommentLike.objects.create(user=request.user, comment=comment, comment_uuid=uuid, point=point)
 
         return HttpResponse(status=201)
     elif request.method == "PUT":
         # Change like to dislike or vice versa
-        obj = ObjectLike.objects.only("point").get(user=request.user, **uuid_field)
+        obj = CommentLike.objects.only("point").get(user=request.user, comment_uuid=uuid)
         if obj.point != point:
             obj.point = point
             obj.save(update_fields=["point"])
@@ -188,13 +192,38 @@ def like(request):
         return HttpResponse()
     elif request.method == "DELETE":
         # Delete a like/dislike
-        ObjectLike.objects.filter(user=request.user, **uuid_field).delete()
+        CommentLike.objects.filter(user=request.user, comment_uuid=uuid).delete()
 
         return HttpResponse(status=204)
 
     return HttpResponseBadRequest()
 
 
+@api_view(["PUT"])
+@permission_classes([IsAuthenticated])
+def vote(request):
+    """
+    Like (v=l), dislike (v=d), or remove vote (v=n) from meme, safe to retry
+
+    Responds with new vote and change in points
+    """
+    uuid = request.GET.get("u")
+    vote = request.GET.get("v")
+
+    if not uuid or len(uuid) != 11 or vote not in ("l", "d", "n"):
+        return HttpResponseBadRequest()
+
+    point = {"l": 1, "d": -1, "n": 0}[vote]
+
+    change = set_meme_vote(request.user.id, uuid, point)
+    if change is None:
+        raise Http404
+
+    cache_vote(request.user.id, "meme", uuid, point)
+
+    return JsonResponse({"vote": point, "change": change})
+
+
 @api_view(("POST", "PUT", "DELETE"))
 @permission_classes([IsAuthenticated])
 def comment(request, action):
@@ -316,18 +345,71 @@ def reply(request):
     return JsonResponse({"uuid": new_reply.uuid})
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def upload(request):
+def check_upload(request):
+    """
+    Check fields of uploaded meme (other than file) and upload limit
+
+    Returns (fields to create meme with, None) or (None, response with error message)
+    """
     page = category = None
     page_name = request.POST.get("page")
-    file = request.FILES.get("file")
     caption = request.POST.get("caption", "").strip()[:100].strip()
     category_name = request.POST.get("category")
     private = request.POST.get("private") == "true"
 
     if len(re.findall("\n", caption)) > 4:
-        return JsonResponse({"success": False, "message": "Maximum new lines reached"})
+        return None, JsonResponse({"success": False, "message": "Maximum new lines reached"})
+
+    # Check upload limits (50 per 24 hours)
+    if Meme.all_objects.filter(user=request.user, upload_date__gt=timezone.now()-timedelta(days=1)).count() >= 50:
+        return None, JsonResponse({"success": False, "message": "Upload limit is 50 per day"})
+
+    if category_name:
+        if category_name not in Category.Name.values:
+            return None, JsonResponse({"success": False, "message": "Category not found"})
+        # category = get_object_or_404(Category, name=category_name)
+        category = Category.objects.get_or_create(name=category_name)[0]    # Change this before deployment
+
+    if page_name:
+        # Don't allow uploads to pages if meme is private
+        if private:
+            return None, JsonResponse({"success": False, "message": "Cannot upload private memes to a page"})
+
+        page = get_object_or_404(Page.objects.only("admin", "private", "permissions"), name=page_name)
+        # User must be admin or subscriber or moderator to post to page
+        if not (page.admin_id == request.user.id
+                    or (page.permissions and page.subscribers.filter(id=request.user.id).exists())
+                        or page.moderators.filter(id=request.user.id).exists()):
+            return None, JsonResponse({"success": False, "message": "Cannot post to this page"})
+
+    tags = re.findall("#([a-zA-Z][a-zA-Z0-9_]*)", request.POST.get("tags", ""))[:20]
+    final_tags = get_upload_tags(tags)
+
+    return {
+        "user": request.user,
+        "username": request.user.username,
+        "user_image": request.user.small_image.name if request.user.small_image else "",
+        "private": private,
+        "page": page,
+        "page_private": page.private if page else False,
+        "page_name": page.name if page else "",
+        "caption": caption,
+        "tags": final_tags,
+        "tags_lower": [t.lower() for t in final_tags],
+        "category": category
+    }, None
+
+
+def upload_created_response(meme):
+    """ Meme is still being processed, client polls upload_status with uuid until it's ready """
+    return JsonResponse({"success": True, "uuid": meme.uuid}, status=201)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload(request):
+    """ Upload meme file through server (see upload_init and upload_complete for uploading straight to storage) """
+    file = request.FILES.get("file")
 
     if file:
         # Check file metadata first
@@ -340,52 +422,102 @@ def upload(request):
             if not res["success"]:
                 return JsonResponse(res)
 
-        # Check upload limits (50 per 24 hours)
-        if Meme.all_objects.filter(user=request.user, upload_date__gt=timezone.now()-timedelta(days=1)).count() >= 50:
-            return JsonResponse({"success": False, "message": "Upload limit is 50 per day"})
+        fields, error = check_upload(request)
+        if error:
+            return error
 
-        if category_name:
-            if category_name not in Category.Name.values:
-                return JsonResponse({"success": False, "message": "Category not found"})
-            # category = get_object_or_404(Category, name=category_name)
-            category = Category.objects.get_or_create(name=category_name)[0]    # Change this before deployment
+        meme = Meme.objects.create(original=file, **fields)
 
-        if page_name:
-            # Don't allow uploads to pages if meme is private
-            if private:
-                return JsonResponse({"success": False, "message": "Cannot upload private memes to a page"})
+        return upload_created_response(meme)
 
-            page = get_object_or_404(Page.objects.only("admin", "private", "permissions"), name=page_name)
-            # User must be admin or subscriber or moderator to post to page
-            if not (page.admin_id == request.user.id
-                        or (page.permissions and page.subscribers.filter(id=request.user.id).exists())
-                            or page.moderators.filter(id=request.user.id).exists()):
-                return JsonResponse({"success": False, "message": "Cannot post to this page"})
+    return JsonResponse({"success": False, "message": "Unexpected error occurred"})
 
-        tags = re.findall("#([a-zA-Z][a-zA-Z0-9_]*)", request.POST.get("tags"))[:20]
-        final_tags = get_upload_tags(tags)
 
-        meme = Meme.objects.create(
-            user=request.user,
-            username=request.user.username,
-            user_image=request.user.small_image.name if request.user.small_image else "",
-            private=private,
-            page=page,
-            page_private=page.private if page else False,
-            page_name=page.name if page else "",
-            original=file,
-            caption=caption,
-            tags=final_tags,
-            tags_lower=[t.lower() for t in final_tags],
-            category=category
-        )
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_init(request):
+    """
+    Start uploading meme file straight to storage bucket
+
+    Returns URL and form fields to POST file to, and token to send to upload_complete with the other fields
+    """
+    name = request.POST.get("name", "")
+    content_type = request.POST.get("type", "")
+    try:
+        size = int(request.POST.get("size", ""))
+    except ValueError:
+        return HttpResponseBadRequest()
 
-        if request.POST.get("is_profile_page"):
-            return JsonResponse({"success": True, "uuid": meme.uuid}, status=201)
-        else:
-            return JsonResponse({"success": True}, status=201)
+    res = check_upload_file_metadata(name, size, content_type)
+    if not res["success"]:
+        return JsonResponse(res)
 
-    return JsonResponse({"success": False, "message": "Unexpected error occurred"})
+    # Check other fields before file is uploaded (checked again in upload_complete)
+    fields, error = check_upload(request)
+    if error:
+        return error
+
+    key = original_meme_path(Meme(user=request.user), name)
+    # File is deleted if upload isn't completed
+    PendingUpload.objects.create(user=request.user, key=key)
+    presigned_post = get_presigned_upload(key, content_type, size)
+    token = signing.dumps({"user": request.user.id, "key": key}, salt="upload")
+
+    return JsonResponse({"success": True, "url": presigned_post["url"], "fields": presigned_post["fields"], "token": token})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_complete(request):
+    """ Create meme after file is uploaded to storage bucket (see upload_init) """
+    try:
+        upload = signing.loads(request.POST.get("token", ""), salt="upload", max_age=settings.UPLOAD_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return JsonResponse({"success": False, "message": "Upload expired, please try again"})
+
+    if upload["user"] != request.user.id:
+        return HttpResponseBadRequest()
+
+    key = upload["key"]
+    if not default_storage.exists(key):
+        return JsonResponse({"success": False, "message": "File not found"})
+
+    fields, error = check_upload(request)
+    if error:
+        return error
+
+    # Check image file is valid (size was limited by presigned POST)
+    if os.path.splitext(key)[1].lower() in (".jpg", ".png", ".jpeg", ".gif"):
+        with default_storage.open(key) as file:
+            res = check_upload_image_file(file)
+        if not res["success"]:
+            if PendingUpload.claim(request.user.id, key):
+                default_storage.delete(key)
+            return JsonResponse(res)
+
+    # Only one request can complete upload (e.g. if submitted twice)
+    if not PendingUpload.claim(request.user.id, key):
+        return JsonResponse({"success": False, "message": "Meme already uploaded"})
+
+    meme = Meme.objects.create(original=key, **fields)
+
+    return upload_created_response(meme)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def upload_status(request, uuid):
+    """ Processing state of uploaded meme ("pending", "ready" or "failed" with message) """
+    meme = Meme.all_objects.only("processing_state").filter(uuid=uuid, user=request.user).first()
+    if meme is not None and meme.processing_state != Meme.ProcessingState.FAILED:
+        return JsonResponse({"state": Meme.ProcessingState(meme.processing_state).name.lower()})
+
+    # Memes that failed are deleted after reason is cached
+    message = get_upload_failure(uuid, request.user.id)
+    if meme is None and message is None:
+        raise Http404
+
+    return JsonResponse({"state": "failed", "message": message or "Could not process file"})
 
 
 @api_view(["POST"])
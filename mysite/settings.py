@@ -103,6 +103,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# Use a Redis server in production (requires django-redis), local memory otherwise (e.g. for tests)
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds to cache responses for anonymous users
+RESPONSE_CACHE_TIMEOUT = 30
+# Seconds to cache votes of each user
+VOTE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -161,6 +185,28 @@ AWS_DEFAULT_ACL = None
 # AWS_S3_REGION_NAME = "us-east-2"
 # AWS_S3_REGION_NAME = "ap-southeast-1"
 AWS_S3_REGION_NAME = "eu-west-2"
+# Set to use an S3-compatible server instead of AWS (e.g. MinIO for local testing)
+AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")
+
+# Seconds that presigned URLs for uploading memes straight to bucket are valid for (see views.upload_init)
+UPLOAD_URL_MAX_AGE = 600
+# Seconds to finish upload after starting it (see views.upload_complete)
+UPLOAD_TOKEN_MAX_AGE = 3600
+# Seconds to keep reason an upload failed after its meme is deleted (see views.upload_status)
+UPLOAD_STATUS_TIMEOUT = 3600
+
+
+# Media processing (see memes/media.py)
+
+# "memes.media.LambdaBackend" to invoke AWS Lambda functions or "memes.media.LocalBackend" to run Pillow/ffmpeg on this server
+MEDIA_PROCESSING_BACKEND = os.environ.get("MEDIA_PROCESSING_BACKEND", "memes.media.LambdaBackend")
+# Local backend: number of worker processes and number of tasks that can wait for a worker
+MEDIA_PROCESSING_WORKERS = os.cpu_count() or 1
+MEDIA_PROCESSING_QUEUE_SIZE = 100
+# Seconds before a local task is stopped, or a Lambda function that is waited for is given up on
+MEDIA_PROCESSING_TIMEOUT = 120
+# Seconds after which memes still not resized are marked as failed (see check_processing command)
+MEDIA_PROCESSING_GIVE_UP = 600
 
 
 # Login URL
@@ -220,6 +266,54 @@ SIMPLE_JWT = {
 }
 
 
+# Views
+
+# Seconds between writing buffered views (0 to write in the request instead of a background thread)
+VIEW_BUFFER_INTERVAL = 5
+# Write buffered views early if this many are buffered
+VIEW_BUFFER_SIZE = 1000
+# Delete views older than this after they are added to hourly and daily view counts
+VIEW_RETENTION_DAYS = 30
+# Seconds to cache estimated number of unique viewers of memes, pages, and profiles
+UNIQUE_VIEWERS_CACHE_TIMEOUT = 60 * 10
+
+
+# Home feed
+
+# Memes from users/pages with at least this many followers/subscribers are pulled when feeds are read
+FEED_FANOUT_LIMIT = 5000
+# How far back to pull memes from popular users/pages
+FEED_PULL_WINDOW = timedelta(days=3)
+# Maximum number of memes added to a feed at once when following or subscribing
+FEED_BACKFILL_SIZE = 50
+
+
+# Hot memes
+
+# Only memes uploaded within this period get a hot score
+HOT_SCORE_WINDOW = timedelta(days=3)
+# Higher gravity makes hot scores decay faster
+HOT_SCORE_GRAVITY = 1.8
+
+
+# Trending tags
+
+# Refresh trending tags when they are older than this
+TRENDING_MAX_AGE = timedelta(hours=1)
+
+
+# Notifications (see notifications/retention.py)
+
+# Delete seen notifications older than this
+NOTIFICATION_RETENTION_DAYS = 90
+# Maximum number of notifications kept for each user
+NOTIFICATION_LIMIT = 500
+# Keep only the latest of "liked" notifications for the same link older than this
+NOTIFICATION_MERGE_DAYS = 7
+# Maximum seconds a request waits for new notifications (see views.wait_notifications)
+NOTIFICATION_WAIT_MAX = 55
+
+
 CORS_ORIGIN_WHITELIST = (
     "http://localhost:3000",
     "http://localhost:19006",
@@ -1,5 +1,7 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, NotificationJob, NotificationCounter
 
 admin.site.register(Notification)
+admin.site.register(NotificationJob)
+admin.site.register(NotificationCounter)
@@ -0,0 +1,101 @@
+from django.db import connection, transaction
+
+import logging
+import select
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationBroker:
+    """
+    Wake requests waiting for new notifications of a user
+
+    With PostgreSQL, publish sends NOTIFY on commit and one thread per process LISTENs for all users,
+    so waiting requests don't query the database. Otherwise (e.g. tests), waiters in the same process are woken directly
+    """
+
+    channel = "new_notifications"
+
+    def __init__(self):
+        # User ID -> set of events of requests waiting for that user
+        self.waiters = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def publish(self, user_ids):
+        """ Wake waiters of users after current transaction commits """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.executemany("SELECT pg_notify(%s, %s)", [(self.channel, str(user_id)) for user_id in user_ids])
+        else:
+            transaction.on_commit(lambda: self.wake(user_ids))
+
+    def wait(self, user_id, timeout, ready=None):
+        """
+        Block until user gets a new notification, returns False if timed out
+
+        ready is called after starting to wait so that notifications published just before aren't missed,
+        returns straight away if it returns True
+        """
+        event = threading.Event()
+
+        with self.lock:
+            self.waiters.setdefault(user_id, set()).add(event)
+
+            # Start listening on first wait, in the worker that serves long polls (a LISTEN thread started
+            # on import would stay in the master process after forking, so waiters here would never be woken)
+            if connection.vendor == "postgresql" and self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="notification-broker", daemon=True)
+                self.thread.start()
+
+        try:
+            return (ready is not None and ready()) or event.wait(timeout)
+        finally:
+            with self.lock:
+                events = self.waiters.get(user_id)
+                events.discard(event)
+                if not events:
+                    del self.waiters[user_id]
+
+    def wake(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                for event in self.waiters.get(user_id, ()):
+                    event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception("Notification listener failed, reconnecting")
+                connection.close()
+                time.sleep(1)
+
+    def listen(self):
+        # Connection of this thread is only used to listen
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        pg_connection = connection.connection
+
+        while True:
+            # Wait for notifications without querying
+            if select.select([pg_connection], [], [], 60) == ([], [], []):
+                continue
+
+            pg_connection.poll()
+            user_ids = set()
+            while pg_connection.notifies:
+                user_ids.add(int(pg_connection.notifies.pop(0).payload))
+
+            self.wake(user_ids)
+
+
+broker = NotificationBroker()
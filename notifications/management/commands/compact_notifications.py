@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import (
+    delete_old_notifications,
+    get_recipients_over_limit,
+    delete_extra_notifications,
+    merge_stale_likes,
+    resync_counters
+)
+
+
+class Command(BaseCommand):
+    help = "Delete old seen notifications, notifications past each user's limit, and stale likes (run periodically, e.g. daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--no-resync", action="store_true", help="Don't recount unread notifications of each user")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        total = self.run_batches(delete_old_notifications, batch_size)
+        self.stdout.write(f"Deleted {total} old notifications")
+
+        # Walk whole table by ID in ranges of batch_size
+        total, after_id = 0, 0
+        while after_id is not None:
+            n, after_id = merge_stale_likes(batch_size, after_id)
+            total += n
+        self.stdout.write(f"Merged {total} stale likes")
+
+        total = 0
+        for recipient_id in get_recipients_over_limit():
+            total += self.run_batches(lambda n: delete_extra_notifications(recipient_id, n), batch_size)
+        self.stdout.write(f"Deleted {total} notifications past limit")
+
+        if not options["no_resync"]:
+            self.stdout.write(f"Fixed {resync_counters(batch_size)} unread counters")
+
+    def run_batches(self, delete, batch_size):
+        total = 0
+        while True:
+            n = delete(batch_size)
+            total += n
+            if n < batch_size:
+                return total
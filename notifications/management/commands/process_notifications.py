@@ -0,0 +1,17 @@
+from memes.management.base import IntervalCommand
+from notifications.queue import process_batch
+
+
+class Command(IntervalCommand):
+    help = "Create queued notifications in batches (run in background, e.g. with --interval 1)"
+
+    interval_help = "Keep processing every INTERVAL seconds"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def run_once(self, **options):
+        # Process until there are no jobs left
+        while process_batch(options["batch_size"]) == options["batch_size"]:
+            pass
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('meme_like', 'Meme Like'), ('comment_like', 'Comment Like'), ('comment', 'Comment'), ('follow', 'Follow'), ('unfollow', 'Unfollow'), ('subscribe', 'Subscribe'), ('unsubscribe', 'Unsubscribe')], max_length=16)),
+                ('object_id', models.PositiveIntegerField()),
+                ('points', models.IntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Count unseen notifications and moderator invites of existing users
+BACKFILL_COUNTERS = """
+INSERT INTO notifications_notificationcounter (user_id, unread, invites)
+SELECT user_id, sum(unread), sum(invites) FROM (
+    SELECT recipient_id AS user_id, count(*) AS unread, 0 AS invites
+    FROM notifications_notification WHERE NOT seen GROUP BY recipient_id
+    UNION ALL
+    SELECT invitee_id, 0, count(*) FROM memes_moderatorinvite GROUP BY invitee_id
+) c
+GROUP BY user_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memes', '0007_memevotedelta'),
+        ('notifications', '0002_notificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='memes.user')),
+                ('unread', models.IntegerField(default=0)),
+                ('invites', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_COUNTERS, migrations.RunSQL.noop),
+    ]
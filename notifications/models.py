@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 
 class Notification(models.Model):
@@ -20,6 +21,82 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-id"]
+        indexes = [models.Index(fields=["recipient", "-timestamp", "-id"])]    # Used in views.notifications
 
     def __str__(self):
         return f"{self.message}"
+
+
+class NotificationJob(models.Model):
+    """
+    Notification waiting to be created by "python manage.py process_notifications" (see queue.py)
+
+    Only IDs are saved so that liking, commenting, and following don't wait for notification work
+    """
+
+    class Kind(models.TextChoices):
+        MEME_LIKE = "meme_like"         # object_id is MemeLike
+        COMMENT_LIKE = "comment_like"   # object_id is CommentLike
+        COMMENT = "comment"             # object_id is Comment (top level comment or reply)
+        FOLLOW = "follow"               # object_id is User who was followed
+        UNFOLLOW = "unfollow"
+        SUBSCRIBE = "subscribe"         # object_id is Page
+        UNSUBSCRIBE = "unsubscribe"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    object_id = models.PositiveIntegerField()
+    # Number of likes to notify about
+    points = models.IntegerField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} by {self.actor_id}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Number of unseen notifications and moderator invites of user so that navbar doesn't count them
+
+    Updated with NotificationCounter.add wherever notifications are created/seen/deleted and invites are created/deleted
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    unread = models.IntegerField(default=0)
+    invites = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} has {self.unread} unread notifications and {self.invites} invites"
+
+    @classmethod
+    def add(cls, field: str, changes: dict):
+        """ Add to unread or invites of users, changes is {user ID: change} """
+        assert field in ("unread", "invites")
+
+        # Sorted to always lock rows in the same order
+        changes = [(user_id, change) for user_id, change in sorted(changes.items()) if change]
+        if not changes:
+            return
+
+        with connection.cursor() as cursor:
+            increments = [(user_id, change) for user_id, change in changes if change > 0]
+            if increments:
+                cursor.executemany(UPSERT_COUNTER.format(field=field), [
+                    (user_id, change if field == "unread" else 0, change if field == "invites" else 0, change)
+                    for user_id, change in increments
+                ])
+
+            # Only update existing counters when decrementing (so users being deleted don't get a new counter)
+            decrements = [(change, user_id) for user_id, change in changes if change < 0]
+            if decrements:
+                cursor.executemany(DECREMENT_COUNTER.format(field=field), decrements)
+
+
+UPSERT_COUNTER = """
+INSERT INTO notifications_notificationcounter (user_id, unread, invites) VALUES (%s, %s, %s)
+ON CONFLICT (user_id) DO UPDATE SET {field} = notifications_notificationcounter.{field} + %s
+"""
+
+# Counters never go below 0 (e.g. if notifications are deleted before they are counted)
+DECREMENT_COUNTER = """
+UPDATE notifications_notificationcounter SET {field} = GREATEST({field} + %s, 0) WHERE user_id = %s
+"""
@@ -0,0 +1,228 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, NotificationJob, NotificationCounter
+from .broker import broker
+from memes.models import User, Meme, MemeLike, CommentLike, Comment, Page
+
+
+"""
+Signals only save a NotificationJob, notifications are created in batches by "python manage.py process_notifications"
+
+Jobs in a batch are coalesced per (recipient, link) so that a burst of likes/comments on the same meme
+is one notification, then all notifications in the batch are written in bulk
+"""
+
+Kind = NotificationJob.Kind
+
+
+def enqueue(kind: str, actor_id: int, object_id: int, points: int = None):
+    NotificationJob.objects.create(kind=kind, actor_id=actor_id, object_id=object_id, points=points)
+
+
+def get_message(username: str, count: int, action: str) -> str:
+    """ e.g. "user liked your meme", "user and 1 other liked your meme", "user and 2 others liked your meme" """
+    s = 's' if count > 2 else ''
+    return f"{username} {f'and {count - 1} other{s} ' if count > 1 else ''}{action}"
+
+
+def process_batch(batch_size: int = 1000) -> int:
+    """ Create notifications for a batch of jobs in one transaction, returns number of jobs processed """
+    with transaction.atomic():
+        # Skip jobs locked by other workers so that workers can run concurrently
+        jobs = list(NotificationJob.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+        if not jobs:
+            return 0
+
+        def get_ids(*kinds):
+            return [job.object_id for job in jobs if job.kind in kinds]
+
+        # Followed users are fetched with actors
+        users = User.objects.only("username", "image").in_bulk(
+            {job.actor_id for job in jobs} | set(get_ids(Kind.FOLLOW, Kind.UNFOLLOW))
+        )
+        meme_likes = MemeLike.objects.select_related("meme") \
+                                     .only("meme__uuid", "meme__user", "meme__thumbnail") \
+                                     .in_bulk(get_ids(Kind.MEME_LIKE))
+        comment_likes = CommentLike.objects.select_related("comment") \
+                                           .only("comment__user", "comment__meme_uuid") \
+                                           .in_bulk(get_ids(Kind.COMMENT_LIKE))
+        comments = Comment.objects.select_related("meme", "reply_to") \
+                                  .only("meme_uuid", "root", "meme__user", "meme__thumbnail", "reply_to__user") \
+                                  .in_bulk(get_ids(Kind.COMMENT))
+        pages = Page.objects.only("admin", "name").in_bulk(get_ids(Kind.SUBSCRIBE, Kind.UNSUBSCRIBE))
+
+        content_types = ContentType.objects.get_for_models(User, Meme, MemeLike, Comment, CommentLike, Page)
+
+        # (recipient, link, content type) -> (points, notification), only most likes are kept
+        likes = {}
+        # (recipient, link, action) -> (IDs of commenters, notification of latest comment)
+        comment_notifs = {}
+        # (action, actor, recipient, object) -> [whether to delete old notification, new notification or None]
+        follows = {}
+
+        for job in jobs:
+            actor = users.get(job.actor_id)
+
+            if job.kind in (Kind.MEME_LIKE, Kind.COMMENT_LIKE):
+                if job.kind == Kind.MEME_LIKE:
+                    like = meme_likes.get(job.object_id)
+                    if like is None:
+                        continue    # Like was removed before job was processed
+                    n = Notification(
+                        recipient_id=like.meme.user_id,
+                        link=f"/m/{like.meme.uuid}",
+                        image=like.meme.thumbnail.name,
+                        message=get_message(actor.username, job.points, "liked your meme"),
+                        content_type=content_types[MemeLike]
+                    )
+                else:
+                    like = comment_likes.get(job.object_id)
+                    if like is None or like.comment.user_id is None:
+                        continue
+                    # Will combine number of likes for all of user's comments on same meme
+                    n = Notification(
+                        recipient_id=like.comment.user_id,
+                        link=f"/m/{like.comment.meme_uuid}",
+                        message=get_message(actor.username, job.points, "liked your comment"),
+                        content_type=content_types[CommentLike]
+                    )
+
+                n.action = "liked"
+                n.object_id = like.id
+                key = (n.recipient_id, n.link, n.content_type_id)
+                if key not in likes or job.points >= likes[key][0]:
+                    likes[key] = (job.points, n)
+
+            elif job.kind == Kind.COMMENT:
+                comment = comments.get(job.object_id)
+                if comment is None:
+                    continue
+
+                if comment.root_id:
+                    # Notify user who posted comment that was directly replied to
+                    n = Notification(
+                        recipient_id=comment.reply_to.user_id,
+                        action="replied",
+                        image=actor.image.name,
+                        content_type=content_types[Comment],
+                        object_id=comment.reply_to_id
+                    )
+                else:
+                    n = Notification(
+                        recipient_id=comment.meme.user_id,
+                        action="commented",
+                        image=comment.meme.thumbnail.name,
+                        content_type=content_types[Meme],
+                        object_id=comment.meme_id
+                    )
+
+                if n.recipient_id in (None, actor.id):
+                    continue
+
+                n.actor = actor
+                n.link = f"/m/{comment.meme_uuid}"
+                key = (n.recipient_id, n.link, n.action)
+                # Count commenters, not comments
+                actor_ids = comment_notifs[key][0] if key in comment_notifs else set()
+                actor_ids.add(actor.id)
+                n.message = get_message(
+                    actor.username, len(actor_ids), "replied to your comment" if comment.root_id else "commented on your meme"
+                )
+                comment_notifs[key] = (actor_ids, n)
+
+            elif job.kind in (Kind.FOLLOW, Kind.UNFOLLOW):
+                if job.object_id not in users:
+                    continue    # Followed user was deleted
+
+                follow = follows.setdefault(("followed", job.actor_id, job.object_id, job.object_id), [False, None])
+                if job.kind == Kind.FOLLOW:
+                    follow[1] = Notification(
+                        actor=actor,
+                        action="followed",
+                        recipient_id=job.object_id,
+                        link=f"/u/{actor.username}",
+                        image=actor.image.name,
+                        message=f"{actor.username} followed you",
+                        content_type=content_types[User],
+                        object_id=job.object_id
+                    )
+                else:
+                    follow[:] = [True, None]
+
+            elif job.kind in (Kind.SUBSCRIBE, Kind.UNSUBSCRIBE):
+                page = pages.get(job.object_id)
+                if page is None:
+                    continue
+
+                follow = follows.setdefault(("subscribed", job.actor_id, page.admin_id, page.id), [False, None])
+                if job.kind == Kind.SUBSCRIBE:
+                    follow[1] = Notification(
+                        actor=actor,
+                        action="subscribed",
+                        recipient_id=page.admin_id,
+                        link=f"/u/{actor.username}",
+                        image=actor.image.name,
+                        message=f"{actor.username} subscribed to {page.name}",
+                        content_type=content_types[Page],
+                        object_id=page.id
+                    )
+                else:
+                    follow[:] = [True, None]
+
+        # Delete follow/subscribe notifications that were undone
+        removed = Q()
+        for (action, actor_id, recipient_id, object_id), (remove, _) in follows.items():
+            if remove:
+                removed |= Q(action=action, actor_id=actor_id, recipient_id=recipient_id, object_id=object_id)
+        # Change in number of unseen notifications of each recipient
+        unread = {}
+
+        if removed:
+            removed = Notification.objects.filter(removed)
+            for recipient_id in removed.filter(seen=False).values_list("recipient_id", flat=True):
+                unread[recipient_id] = unread.get(recipient_id, 0) - 1
+            removed.delete()
+
+        new = [n for _, n in comment_notifs.values()] + [n for _, n in follows.values() if n]
+
+        # Update existing like notifications (or create new ones)
+        if likes:
+            existing = Notification.objects.filter(
+                recipient_id__in={key[0] for key in likes},
+                link__in={key[1] for key in likes},
+                content_type_id__in={key[2] for key in likes}
+            )
+            existing = {(n.recipient_id, n.link, n.content_type_id): n for n in existing}
+
+            updated = []
+            now = timezone.now()
+            for key, (_, n) in likes.items():
+                if key in existing:
+                    old = existing[key]
+                    old.action, old.message, old.object_id = n.action, n.message, n.object_id
+                    old.image = n.image or old.image
+                    if old.seen:
+                        unread[old.recipient_id] = unread.get(old.recipient_id, 0) + 1
+                    old.seen = False
+                    old.timestamp = now
+                    updated.append(old)
+                else:
+                    new.append(n)
+
+            Notification.objects.bulk_update(updated, ["action", "image", "seen", "message", "timestamp", "object_id"])
+
+        Notification.objects.bulk_create(new)
+
+        for n in new:
+            unread[n.recipient_id] = unread.get(n.recipient_id, 0) + 1
+        NotificationCounter.add("unread", unread)
+
+        # Wake requests waiting for new notifications
+        broker.publish(user_id for user_id, change in unread.items() if change > 0)
+
+        NotificationJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+
+    return len(jobs)
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+
+from collections import Counter
+from datetime import timedelta
+
+
+"""
+Notifications are compacted in batches by "python manage.py compact_notifications"
+so that the table and its indexes only grow with active users
+"""
+
+# Old "liked" notifications in an ID range that have a newer "liked" notification on the same link (anywhere in table),
+# e.g. from before likes were coalesced (uses index on recipient)
+STALE_LIKES = """
+SELECT n.id FROM notifications_notification n
+WHERE n.id > %(after)s AND n.id <= %(until)s AND n.action = 'liked' AND n.timestamp < %(cutoff)s
+    AND EXISTS (
+        SELECT 1 FROM notifications_notification newer
+        WHERE newer.recipient_id = n.recipient_id AND newer.link = n.link
+            AND newer.content_type_id IS NOT DISTINCT FROM n.content_type_id AND newer.action = 'liked'
+            AND (newer.timestamp, newer.id) > (n.timestamp, n.id)
+    )
+"""
+
+
+def delete_notifications(ids: list) -> int:
+    """ Delete notifications and decrement unread counters of recipients """
+    if not ids:
+        return 0
+
+    with transaction.atomic():
+        unread = Counter(Notification.objects.filter(id__in=ids, seen=False).values_list("recipient_id", flat=True))
+        num_deleted = Notification.objects.filter(id__in=ids).delete()[0]
+        NotificationCounter.add("unread", {recipient_id: -n for recipient_id, n in unread.items()})
+
+    return num_deleted
+
+
+def delete_old_notifications(batch_size: int = 10000) -> int:
+    """ Delete a batch of seen notifications past retention period """
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+
+    # Oldest notifications have lowest IDs so scanning by ID finds them first
+    ids = Notification.objects.filter(seen=True, timestamp__lt=cutoff) \
+                              .order_by("id") \
+                              .values_list("id", flat=True)[:batch_size]
+
+    return delete_notifications(list(ids))
+
+
+def get_recipients_over_limit() -> list:
+    return list(
+        Notification.objects.order_by()
+                            .values("recipient")
+                            .annotate(n=Count("id"))
+                            .filter(n__gt=settings.NOTIFICATION_LIMIT)
+                            .values_list("recipient", flat=True)
+    )
+
+
+def delete_extra_notifications(recipient_id: int, batch_size: int = 10000) -> int:
+    """ Delete a batch of oldest notifications of recipient past NOTIFICATION_LIMIT """
+    limit = settings.NOTIFICATION_LIMIT
+
+    # Uses index on (recipient, -timestamp, -id)
+    ids = Notification.objects.filter(recipient_id=recipient_id) \
+                              .order_by("-timestamp", "-id") \
+                              .values_list("id", flat=True)[limit:limit + batch_size]
+
+    return delete_notifications(list(ids))
+
+
+def merge_stale_likes(batch_size: int = 10000, after_id: int = 0):
+    """
+    Delete old "liked" notifications that have a newer one for the same recipient and link,
+    checking the batch_size notifications after after_id, returns (number deleted, ID to continue after or None if done)
+    """
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATION_MERGE_DAYS)
+
+    ids = list(Notification.objects.filter(id__gt=after_id).order_by("id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return 0, None
+
+    with connection.cursor() as cursor:
+        cursor.execute(STALE_LIKES, {"after": after_id, "until": ids[-1], "cutoff": cutoff})
+        stale = [row[0] for row in cursor.fetchall()]
+
+    return delete_notifications(stale), ids[-1] if len(ids) == batch_size else None
+
+
+def resync_counters(batch_size: int = 10000) -> int:
+    """ Set unread counters to the number of unseen notifications (fixes drift), returns number of counters changed """
+    changed = 0
+    last_user_id = 0
+
+    while True:
+        counters = list(
+            NotificationCounter.objects.filter(user_id__gt=last_user_id)
+                                       .order_by("user_id")
+                                       .values_list("user_id", "unread")[:batch_size]
+        )
+        if not counters:
+            return changed
+
+        user_ids = [user_id for user_id, _ in counters]
+        unread = dict(
+            Notification.objects.filter(recipient_id__in=user_ids, seen=False)
+                                .order_by()
+                                .values("recipient")
+                                .annotate(n=Count("id"))
+                                .values_list("recipient", "n")
+        )
+
+        for user_id, count in counters:
+            if unread.get(user_id, 0) != count:
+                changed += NotificationCounter.objects.filter(user_id=user_id).update(unread=unread.get(user_id, 0))
+
+        last_user_id = user_ids[-1]
@@ -1,10 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete
 from django.dispatch import receiver, Signal
-from .models import Notification
-from memes.models import User, MemeLike, CommentLike, Comment, Meme, Page
+from .models import NotificationJob, NotificationCounter
+from .queue import enqueue
+from memes.models import User, MemeLike, CommentLike, Comment, Page, ModeratorInvite
 from django.db.models import F
-from django.utils import timezone
-from django.contrib.contenttypes.models import ContentType
 
 
 """
@@ -14,31 +13,18 @@ so get_for_model is called twice for each model
 """
 
 
+def is_like_milestone(points):
+    """ Notify for every like up to 10 likes, every 25 likes up to 100 likes, then every 100 likes """
+    return points < 11 or (points < 101 and points % 25 == 0) or points % 100 == 0
+
+
 meme_voted_signal = Signal(providing_args=["instance", "meme", "points"])
 
 
 @receiver(meme_voted_signal, sender=MemeLike)
 def notify_meme_like(sender, instance, meme, points, **kwargs):
-    # Notify for every like up to 10 likes, every 25 likes up to 100 likes, then every 100 likes
-    if points < 11 or (points < 101 and points % 25 == 0) or points % 100 == 0:
-        # Create message
-        s = 's' if points > 2 else ''
-        username = User.objects.values_list("username", flat=True).get(id=instance.user_id)
-        message = f"{username} {f'and {points - 1} other{s} ' if points > 1 else ''}liked your meme"
-
-        Notification.objects.update_or_create(
-            recipient=meme.user,
-            link=f"/m/{meme.uuid}",
-            content_type=ContentType.objects.get_for_model(MemeLike),
-            defaults={
-                "action": "liked",
-                "image": meme.thumbnail.name,
-                "seen": False,
-                "message": message,
-                "timestamp": timezone.now(),
-                "object_id": instance.id,
-            }
-        )
+    if is_like_milestone(points):
+        enqueue(NotificationJob.Kind.MEME_LIKE, instance.user_id, instance.id, points)
 
 
 comment_voted_signal = Signal(providing_args=["instance", "comment", "points"])
@@ -46,26 +32,9 @@ comment_voted_signal = Signal(providing_args=["instance", "comment", "points"])
 
 @receiver(comment_voted_signal, sender=CommentLike)
 def notify_comment_like(sender, instance, comment, points, **kwargs):
-    # Update or create notification if vote is a like (not dislike), same as above ^
-    if points < 11 or (points < 101 and points % 25 == 0) or points % 100 == 0:
-        # Create message
-        s = 's' if points > 2 else ''
-        username = User.objects.values_list("username", flat=True).get(id=instance.user_id)
-        message = f"{username} {f'and {points - 1} other{s} ' if points > 1 else ''}liked your comment"
-
-        # Will combine number of likes for all of user's comments on same meme
-        Notification.objects.update_or_create(
-            recipient=comment.user,
-            link=f"/m/{comment.meme_uuid}",
-            content_type=ContentType.objects.get_for_model(CommentLike),
-            defaults={
-                "action": "liked",
-                "seen": False,
-                "message": message,
-                "timestamp": timezone.now(),
-                "object_id": instance.id,
-            }
-        )
+    # Notify if vote is a like (not dislike)
+    if is_like_milestone(points):
+        enqueue(NotificationJob.Kind.COMMENT_LIKE, instance.user_id, instance.id, points)
 
 
 comment_posted_signal = Signal(providing_args=["instance"])
@@ -78,34 +47,7 @@ def notify_comment(sender, instance, **kwargs):
         # Update number of replies on root comment
         Comment.objects.filter(id=instance.root_id).update(num_replies=F("num_replies") + 1)
 
-        # Get comment that was directly replied to
-        reply_to = Comment.objects.select_related("user").only("num_replies", "user__id").get(id=instance.reply_to_id)
-        # Get user who posted reply
-        actor = User.objects.only("image", "username").get(id=instance.user_id)
-        if reply_to.user.id != instance.user_id:
-            Notification.objects.create(
-                actor=actor,
-                action="replied",
-                recipient=reply_to.user,
-                link=f"/m/{instance.meme_uuid}",
-                image=actor.image.name,
-                message=f"{actor.username} replied to your comment",
-                content_object=reply_to
-            )
-    # If instance is a top level comment
-    else:
-        meme = Meme.objects.select_related("user").only("user__id", "thumbnail").get(id=instance.meme_id)
-        if meme.user.id != instance.user_id:
-            actor = User.objects.only("username").get(id=instance.user_id)
-            Notification.objects.create(
-                actor=actor,
-                action="commented",
-                recipient=meme.user,
-                link=f"/m/{instance.meme_uuid}",
-                image=meme.thumbnail.name,
-                message=f"{actor.username} commented on your meme",
-                content_object=meme
-            )
+    enqueue(NotificationJob.Kind.COMMENT, instance.user_id, instance.id)
 
 
 follow_user_signal = Signal(providing_args=["instance", "action", "pk"])
@@ -114,22 +56,9 @@ follow_user_signal = Signal(providing_args=["instance", "action", "pk"])
 @receiver(follow_user_signal, sender=User.followers.through)
 def notify_follow(sender, instance, action, pk, **kwargs):
     if action == "post_add":
-        followed_user = User.objects.only("id").get(id=pk)
-        Notification.objects.create(
-            actor=instance,
-            action="followed",
-            recipient=followed_user,
-            link=f"/u/{instance.username}",
-            image=instance.image.name,
-            message=f"{instance.username} followed you",
-            content_object=followed_user
-        )
+        enqueue(NotificationJob.Kind.FOLLOW, instance.id, pk)
     elif action == "post_remove":
-        Notification.objects.filter(
-            actor=instance,
-            action="followed",
-            recipient_id=pk
-        ).delete()
+        enqueue(NotificationJob.Kind.UNFOLLOW, instance.id, pk)
 
 
 subscribe_page_signal = Signal(providing_args=["instance", "action", "pk"])
@@ -138,21 +67,12 @@ subscribe_page_signal = Signal(providing_args=["instance", "action", "pk"])
 @receiver(subscribe_page_signal, sender=Page.subscribers.through)
 def notify_subscribe(sender, instance, action, pk, **kwargs):
     if action == "post_add":
-        new_sub = User.objects.only("username", "image").get(id=pk)
-        page_admin = User.objects.only("id").get(id=instance.admin_id)
-        Notification.objects.create(
-            actor=new_sub,
-            action="subscribed",
-            recipient=page_admin,
-            link=f"/u/{new_sub.username}",
-            image=new_sub.image.name,
-            message=f"{new_sub.username} subscribed to {instance.name}",
-            content_object=instance
-        )
+        enqueue(NotificationJob.Kind.SUBSCRIBE, pk, instance.id)
     elif action == "post_remove":
-        Notification.objects.filter(
-            actor_id=pk,
-            action="subscribed",
-            recipient_id=instance.admin_id,
-            object_id=instance.id
-        ).delete()
+        enqueue(NotificationJob.Kind.UNSUBSCRIBE, pk, instance.id)
+
+
+@receiver(post_delete, sender=ModeratorInvite)
+def delete_invite(sender, instance, **kwargs):
+    # Also called for each invite when invites are deleted in bulk or page is deleted
+    NotificationCounter.add("invites", {instance.invitee_id: -1})
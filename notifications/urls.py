@@ -6,6 +6,8 @@ from . import views
 
 urlpatterns = [
     path("nav", views.nav_notifications, name="nav_notifications"),
+    path("count", views.notification_count, name="notification_count"),
+    path("wait", views.wait_notifications, name="wait_notifications"),
     path("", views.notifications, name="notifications"),
 ]
 
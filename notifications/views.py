@@ -1,55 +1,101 @@
+from django.conf import settings
 from django.http import HttpResponseBadRequest
-from django.core.paginator import Paginator
+from django.db import connection
 
-from .models import Notification
-from memes.models import ModeratorInvite
+from .models import Notification, NotificationCounter
+from .broker import broker
+from memes.pagination import NotificationPagination
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+import math
+
+
+def mark_seen(user, ids):
+    """ Mark notifications as seen in one UPDATE and decrement unread counter by number that weren't seen yet """
+    if ids:
+        num_seen = Notification.objects.filter(id__in=ids, recipient=user, seen=False).update(seen=True)
+        NotificationCounter.add("unread", {user.id: -num_seen})
+
+
+def get_counts(user):
+    """ Get (number of unseen notifications, number of moderator invites) of user """
+    return NotificationCounter.objects.filter(user=user).values_list("unread", "invites").first() or (0, 0)
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def nav_notifications(request):
-    notifs = Notification.objects.filter(recipient=request.user, seen=False)
-    to_send = notifs[:5]
+    unread, invites = get_counts(request.user)
 
     results = []
-    for n in to_send:
-        results.append({"link": n.link, "image": n.image.url if n.image else None, "message": n.message})
-        n.seen = True
+    if unread:
+        to_send = Notification.objects.filter(recipient=request.user, seen=False).only("link", "image", "message")[:5]
 
-    response = {
-        "count": notifs.count() + ModeratorInvite.objects.filter(invitee=request.user).count(),
-        "results": results
-    }
+        for n in to_send:
+            results.append({"link": n.link, "image": n.image.url if n.image else None, "message": n.message})
 
-    Notification.objects.bulk_update(to_send, ["seen"])
+        mark_seen(request.user, [n.id for n in to_send])
 
-    return Response(response)
+    return Response({"count": unread + invites, "results": results})
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def notifications(request):
-    notifs = Notification.objects.filter(recipient=request.user).order_by("-timestamp")
+def notification_count(request):
+    """ Get number of unseen notifications and moderator invites (for badge in navbar) """
+    return Response({"count": sum(get_counts(request.user))})
 
-    p = Paginator(notifs, 20)
-    if "page" not in request.GET:
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def wait_notifications(request):
+    """
+    Long poll for number of unseen notifications and moderator invites (instead of polling nav_notifications)
+
+    Returns straight away if count is different from count in query, otherwise waits for a new notification
+    or until timeout, waiting doesn't query the database (see broker.NotificationBroker)
+    """
+    try:
+        known_count = int(request.GET.get("count", -1))
+        timeout = float(request.GET.get("timeout", 25))
+    except ValueError:
         return HttpResponseBadRequest()
-    page_num = request.GET["page"]
 
-    current_page = p.get_page(page_num)
-    objs = current_page.object_list
-    to_send = [n for n in objs.values("link", "seen", "message", "timestamp")]
+    # float() accepts "nan", "inf" and negative numbers
+    if not math.isfinite(timeout) or timeout <= 0:
+        return HttpResponseBadRequest()
+    timeout = min(timeout, settings.NOTIFICATION_WAIT_MAX)
+
+    count = None
+
+    def ready():
+        nonlocal count
+        count = sum(get_counts(request.user))
+        if count != known_count:
+            return True
+
+        # Don't hold a database connection while waiting
+        connection.close()
+        return False
+
+    if broker.wait(request.user.id, timeout, ready):
+        count = sum(get_counts(request.user))
+
+    return Response({"count": count})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def notifications(request):
+    notifs = Notification.objects.filter(recipient=request.user).only("link", "seen", "message", "timestamp")
 
-    for obj in objs:
-        obj.seen = True
+    paginator = NotificationPagination()
+    page = paginator.paginate_queryset(notifs, request)
+    to_send = [{"link": n.link, "seen": n.seen, "message": n.message, "timestamp": n.timestamp} for n in page]
 
-    Notification.objects.bulk_update(objs, ["seen"])
+    mark_seen(request.user, [n.id for n in page if not n.seen])
 
-    return Response({
-        "next": current_page.next_page_number() if current_page.has_next() else None,
-        "results": to_send
-    })
+    return paginator.get_paginated_response(to_send)
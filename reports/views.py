@@ -7,6 +7,7 @@ from django.conf import settings
 from .models import Report
 from .utils import get_moderation_labels, analyze_labels
 from memes.models import Meme, Comment, Page, User
+from analytics.trending import count_tags_of_memes
 
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
@@ -14,6 +15,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
 
+def hide_meme(meme, update_fields):
+    """ Hide meme and remove its tags from trending tag counts """
+    if not meme.hidden:
+        count_tags_of_memes(Meme.objects.filter(id=meme.id), -1)
+
+    meme.hidden = True
+    meme.save(update_fields=update_fields)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_report(request):
@@ -74,8 +84,7 @@ def create_report(request):
             to_report.save(update_fields=["banned"])
     if report_count > 10:
         if obj_name == "meme":
-            to_report.hidden = True
-            to_report.save(update_fields=["hidden"])
+            hide_meme(to_report, ["hidden"])
         elif obj_name in ("comment", "reply"):
             to_report.deleted = 4
             to_report.save(update_fields=["deleted"])
@@ -87,8 +96,7 @@ def create_report(request):
             analysis = analyze_labels(labels)
             if analysis["hide"]:
                 if obj_name == "meme":
-                    to_report.hidden = True
-                    to_report.save(update_fields=("report_labels", "hidden"))
+                    hide_meme(to_report, ("report_labels", "hidden"))
                 else:
                     to_report.deleted = 4
                     to_report.save(update_fields=("report_labels", "deleted"))